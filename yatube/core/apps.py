@@ -1,5 +1,44 @@
+from contextlib import contextmanager
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+from .db import configure_connection
+
+
+def clear_caches(sender, plan=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Кэш общий для процессов и переживает перезапуск, поэтому после
+    # применения миграций (в том числе при создании тестовой БД) в нём
+    # могут остаться страницы и поколения от прежних данных. Миграции
+    # других БД (например, в benchmark_writes) кэша не касаются.
+    if plan and using == DEFAULT_DB_ALIAS:
+        # caches.all() отдаёт только уже созданные кэши, а очистка
+        # двухуровневого кэша создаёт его L2 по ходу обхода.
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+
+@contextmanager
+def keep_caches():
+    """Миграции внутри блока не очищают кэш (например, временные БД
+    run_benchmark)."""
+    post_migrate.disconnect(dispatch_uid='core.clear_caches')
+    try:
+        yield
+    finally:
+        post_migrate.connect(clear_caches, dispatch_uid='core.clear_caches')
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import auth  # noqa: F401
+
+        post_migrate.connect(clear_caches, dispatch_uid='core.clear_caches')
+        connection_created.connect(
+            configure_connection, dispatch_uid='core.configure_connection')
@@ -0,0 +1,26 @@
+"""Пользователь запроса из кэша.
+
+AuthenticationMiddleware на каждом запросе вошедшего пользователя
+загружает его из auth_user. CachedModelBackend берёт объект через
+User.cached (core.objectcache.ObjectCache): из кэша, а сохранение и
+удаление пользователя - в том числе смена пароля и last_login при
+входе - удаляют запись. Изменения через QuerySet.update() кэш не видит.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .objectcache import ObjectCache
+
+User = get_user_model()
+# Модель пользователя - из django.contrib.auth, поэтому кэш
+# добавляется к ней здесь, а не в объявлении класса.
+ObjectCache('pk', 'username').contribute_to_class(User, 'cached')
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        try:
+            user = User.cached.get(pk=user_id)
+        except (User.DoesNotExist, ValueError, TypeError):
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,330 @@
+"""Кэш в файле SQLite, общий для всех процессов сервера на одной машине.
+
+В отличие от LocMemCache, страницы, карточки и номера поколений видны
+всем воркерам сразу: смена поколения в одном процессе делает страницы
+устаревшими во всех. Файл работает в режиме WAL, поэтому чтения не
+ждут записей.
+
+Размер кэша ограничен OPTIONS['MAX_BYTES'] (и MAX_ENTRIES, как у
+встроенных бэкендов): при превышении удаляются просроченные записи, а
+затем давно не читавшиеся (LRU). Время чтения записи обновляется не
+чаще раза в ACCESS_RESOLUTION секунд, чтобы чтения не превращались в
+записи.
+
+Целые числа хранятся как INTEGER, поэтому incr - это один атомарный
+UPDATE, остальные значения - pickle.
+
+В кэше бывают сессии и объекты пользователей, поэтому каталог файла
+создаётся с правами 0700, а сам файл - 0600; файлы -wal и -shm SQLite
+создаёт с теми же правами, что и у основного.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+ACCESS_RESOLUTION = 10
+# Ограничение SQLite на число параметров запроса.
+MAX_VARIABLES = 500
+INT64 = (-2 ** 63, 2 ** 63 - 1)
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    """
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        entries INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    )
+    """,
+    'INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0)',
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+        UPDATE cache_stats
+        SET entries = entries + 1, bytes = bytes + new.size;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+    BEGIN
+        UPDATE cache_stats SET bytes = bytes - old.size + new.size;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+        UPDATE cache_stats
+        SET entries = entries - 1, bytes = bytes - old.size;
+    END
+    """,
+)
+
+UPSERT = """
+    INSERT INTO cache (key, value, expires, accessed, size)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        value = excluded.value,
+        expires = excluded.expires,
+        accessed = excluded.accessed,
+        size = excluded.size
+"""
+
+
+def _encode(value):
+    if type(value) is int and INT64[0] <= value <= INT64[1]:
+        return value, 8
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(data)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+def _chunks(items, size=MAX_VARIABLES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _create_private(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        options = params.get('OPTIONS', {})
+        self.max_bytes = int(options.get('MAX_BYTES', 256 * 1024 * 1024))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    # Соединения
+
+    def _connection(self):
+        # Своё соединение у каждого потока и у процесса после fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            _create_private(self.path)
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            with _transaction(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def close(self, **kwargs):
+        # Django вызывает close() в конце каждого запроса; соединение с
+        # файлом кэша дешевле держать открытым.
+        pass
+
+    # Запись
+
+    def _store(self, connection, items, timeout):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in items:
+            data, size = _encode(value)
+            rows.append((key, data, expires, now, size))
+        connection.executemany(UPSERT, rows)
+        self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        entries, size = connection.execute(
+            'SELECT entries, bytes FROM cache_stats').fetchone()
+        if entries <= self._max_entries and size <= self.max_bytes:
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        # Освобождаем с запасом, чтобы не чистить на каждой записи.
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, bytes FROM cache_stats').fetchone()
+            if (entries <= self._max_entries * 0.9
+                    and size <= self.max_bytes * 0.9) or not entries:
+                return
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),),
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        with _transaction(connection):
+            self._store(connection, [(key, value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items.append((key, value))
+        connection = self._connection()
+        with _transaction(connection):
+            self._store(connection, items, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        data, size = _encode(value)
+        connection = self._connection()
+        with _transaction(connection):
+            # Существующую запись заменяем, только если она просрочена.
+            cursor = connection.execute(
+                UPSERT + ' WHERE cache.expires <= ?',
+                (key, data, self.get_backend_timeout(timeout), now, size,
+                 now),
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._evict(connection, now)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        now = time.time()
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        now = time.time()
+        with _transaction(connection):
+            cursor = connection.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, key, now),
+            )
+            if cursor.rowcount != 1:
+                raise ValueError(f"Key '{key}' not found")
+            value, = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        return value
+
+    # Чтение
+
+    def _fetch(self, keys):
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        stale = []
+        for chunk in _chunks(keys):
+            placeholders = ', '.join('?' * len(chunk))
+            rows = connection.execute(
+                f'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({placeholders})',
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = value
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+        if stale:
+            for chunk in _chunks(stale):
+                placeholders = ', '.join('?' * len(chunk))
+                connection.execute(
+                    f'UPDATE cache SET accessed = ? '
+                    f'WHERE key IN ({placeholders})',
+                    [now, *chunk],
+                )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        found = self._fetch([key])
+        if key not in found:
+            return default
+        return _decode(found[key])
+
+    def get_many(self, keys, version=None):
+        keys_map = {}
+        for key in keys:
+            made = self.make_key(key, version=version)
+            self.validate_key(made)
+            keys_map[made] = key
+        found = self._fetch(list(keys_map))
+        return {
+            keys_map[key]: _decode(value) for key, value in found.items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    # Удаление
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        connection = self._connection()
+        with _transaction(connection):
+            for chunk in _chunks(keys):
+                placeholders = ', '.join('?' * len(chunk))
+                connection.execute(
+                    f'DELETE FROM cache WHERE key IN ({placeholders})', chunk)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT: блокировка записи берётся сразу."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.connection.execute('COMMIT')
+        else:
+            self.connection.execute('ROLLBACK')
@@ -0,0 +1,242 @@
+"""Двухуровневый кэш: LRU в памяти процесса (L1) над любым кэшем (L2).
+
+L2 задаётся алиасом в LOCATION. Чтение сначала смотрит в L1 и только
+при промахе идёт в L2; запись идёт в оба уровня.
+
+Неизменяемые значения (строки, числа, кортежи, frozenset) хранятся в L1
+как есть, поэтому попадание не стоит ни ввода-вывода, ни распаковки.
+Остальные хранятся в pickle и распаковываются на каждое чтение, чтобы
+запросы не делили один изменяемый объект; поэтому страницы (см.
+posts.caching) кладутся в кэш кортежем, а не HttpResponse.
+
+Устаревание записей L1:
+- каждая живёт не дольше OPTIONS['L1_TIMEOUT'] секунд;
+- delete и incr увеличивают эпоху пространства ключа в L2 - части ключа
+  до первого двоеточия ("gen", "page", ...; ключи без двоеточия - одно
+  общее пространство). Процесс сверяет эпохи не чаще раза в
+  EPOCH_CHECK_INTERVAL секунд, и записи пространства с прежней эпохой
+  перестают использоваться, а записи остальных пространств остаются.
+  Свой процесс видит новую эпоху сразу. clear сбрасывает все эпохи.
+Перезапись ключа через set в других процессах видна не позже
+L1_TIMEOUT, поэтому через L1 стоит хранить только неизменяемые по
+ключу данные (страницы и карточки с версией в ключе, поколения).
+"""
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+EPOCH_KEY = 'tiered:epoch'
+IMMUTABLE = (str, bytes, int, float, bool, type(None))
+_MISSING = object()
+
+
+def _new_epoch():
+    return random.getrandbits(48)
+
+
+def _namespace(key):
+    namespace, colon, _ = key.partition(':')
+    return namespace if colon else ''
+
+
+def _epoch_key(namespace):
+    return f'{EPOCH_KEY}:{namespace}'
+
+
+def _is_immutable(value):
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(item) for item in value)
+    return type(value) in IMMUTABLE
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._l2_alias = location
+        self._l2 = None
+        options = params.get('OPTIONS', {})
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.epoch_interval = float(options.get('EPOCH_CHECK_INTERVAL', 1))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epochs = {}
+        self._epoch_checked = 0.0
+
+    @property
+    def l2(self):
+        if self._l2 is None:
+            self._l2 = caches[self._l2_alias]
+        return self._l2
+
+    # Эпоха
+
+    def _current_epoch(self, key):
+        now = time.monotonic()
+        if now - self._epoch_checked >= self.epoch_interval:
+            self._refresh_epochs(now)
+        namespace = _namespace(key)
+        epoch = self._epochs.get(namespace)
+        if epoch is None:
+            epoch_key = _epoch_key(namespace)
+            epoch = self.l2.get(epoch_key)
+            if epoch is None:
+                self.l2.add(epoch_key, _new_epoch(), None)
+                epoch = self.l2.get(epoch_key)
+            self._epochs[namespace] = epoch
+        return epoch
+
+    def _refresh_epochs(self, now):
+        # Эпохи всех известных процессу пространств - одним get_many.
+        keys = {_epoch_key(namespace): namespace
+                for namespace in list(self._epochs)}
+        found = self.l2.get_many(keys) if keys else {}
+        self._epochs = {
+            namespace: found[key]
+            for key, namespace in keys.items() if key in found
+        }
+        self._epoch_checked = now
+
+    def _bump_epoch(self, namespace):
+        epoch_key = _epoch_key(namespace)
+        try:
+            epoch = self.l2.incr(epoch_key)
+        except ValueError:
+            # Ключ эпохи пропал (clear или вытеснение): новая эпоха
+            # случайна, чтобы не совпасть с прежней ни у одного процесса.
+            epoch = _new_epoch()
+            self.l2.set(epoch_key, epoch, None)
+        self._epochs[namespace] = epoch
+
+    # L1
+
+    def _l1_get(self, key, epoch):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            stored, pickled, expires, entry_epoch = entry
+            if entry_epoch != epoch or expires <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(stored) if pickled else stored
+
+    def _l1_set(self, key, value, epoch, timeout=DEFAULT_TIMEOUT):
+        ttl = self.l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            self._l1_delete(key)
+            return
+        if _is_immutable(value):
+            entry = (value, False)
+        else:
+            entry = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), True)
+        with self._lock:
+            self._entries[key] = entry + (time.monotonic() + ttl, epoch)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.l1_max_entries:
+                self._entries.popitem(last=False)
+
+    def _l1_delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear_l1(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Интерфейс кэша
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        epoch = self._current_epoch(key)
+        value = self._l1_get(local_key, epoch)
+        if value is not _MISSING:
+            return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        self._l1_set(local_key, value, epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        epochs = {key: self._current_epoch(key) for key in keys}
+        found, missing = {}, []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version=version),
+                                 epochs[key])
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            fetched = self.l2.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self._l1_set(self.make_key(key, version=version), value,
+                             epochs[key])
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        if self._l1_get(self.make_key(key, version=version),
+                        self._current_epoch(key)) is not _MISSING:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self.make_key(key, version=version), value,
+                     self._current_epoch(key), timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self.make_key(key, version=version), value,
+                             self._current_epoch(key), timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(self.make_key(key, version=version), value,
+                         self._current_epoch(key), timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_key(key, version=version))
+        value = self.l2.incr(key, delta, version=version)
+        self._bump_epoch(_namespace(key))
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._l1_delete(*(self.make_key(key, version=version)
+                          for key in keys))
+        self.l2.delete_many(keys, version=version)
+        for namespace in {_namespace(key) for key in keys}:
+            self._bump_epoch(namespace)
+
+    def clear(self):
+        # Ключи эпох пропадают вместе с L2: другие процессы при сверке
+        # не найдут свои эпохи и возьмут новые.
+        self.clear_l1()
+        self.l2.clear()
+        self._epochs = {}
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -0,0 +1,76 @@
+"""Настройка SQLite для работы сайта под нагрузкой.
+
+При открытии соединения включаются прагмы из settings.SQLITE_PRAGMAS:
+WAL (чтения не ждут записей), synchronous=NORMAL (в WAL это безопасно
+и без fsync на каждый коммит), mmap, размер кэша страниц и busy_timeout.
+
+busy_timeout не спасает транзакцию, которая начала с чтения и потом
+пишет: если между её BEGIN и первой записью коммит сделал другой
+процесс, SQLite сразу отвечает "database is locked". Такие транзакции
+повторяются целиком с экспоненциальной задержкой (atomic_with_retry).
+Повторяется только запись: форма и загруженный файл к этому моменту уже
+разобраны и сохранены.
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db import transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: прагмы для соединений SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    # Напрямую через sqlite3, чтобы прагмы не попадали в счётчики
+    # запросов (query_budget, Server-Timing).
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked(error):
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def atomic_with_retry(func, using=DEFAULT_DB_ALIAS, retries=None):
+    """Выполняет func() в transaction.atomic, повторяя при блокировке БД.
+
+    Между попытками - случайная пауза до DB_LOCKED_BACKOFF * 2 ** n.
+    Внутри уже открытой транзакции повторять нечего: func() вызывается
+    как есть, и блокировка достаётся внешнему коду.
+    """
+    if connections[using].in_atomic_block:
+        return func()
+    if retries is None:
+        retries = settings.DB_LOCKED_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func()
+        except OperationalError as error:
+            if attempt == retries or not is_locked(error):
+                raise
+        metrics.DB_LOCK_RETRIES.inc()
+        delay = random.uniform(0, settings.DB_LOCKED_BACKOFF * 2 ** attempt)
+        logger.info('БД занята, повтор %s через %.3f с', attempt + 1, delay)
+        time.sleep(delay)
+
+
+def now_and_on_commit(func, using=DEFAULT_DB_ALIAS):
+    """Вызывает func() сразу и, если открыта транзакция, ещё раз после
+    её коммита.
+
+    Для сброса кэшей из сигналов: сброс до коммита виден своему
+    запросу, но другой запрос успевает закэшировать старые данные по
+    новому ключу; повторный сброс после коммита делает их ненужными.
+    """
+    func()
+    if connections[using].in_atomic_block:
+        transaction.on_commit(func, using=using)
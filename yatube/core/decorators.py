@@ -0,0 +1,75 @@
+import contextvars
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_uncounted = contextvars.ContextVar('query_budget_uncounted', default=False)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def uncounted():
+    """Запросы внутри блока не входят в бюджет query_budget.
+
+    Для работы, которая не зависит от представления: например, создания
+    миниатюры при первом показе картинки.
+    """
+    token = _uncounted.set(True)
+    try:
+        yield
+    finally:
+        _uncounted.reset(token)
+
+
+class QueryCounter:
+    """Обёртка для connection.execute_wrapper, считающая запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _uncounted.get():
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(limit):
+    """Следит, чтобы представление укладывалось в limit запросов к БД.
+
+    При превышении пишет предупреждение в лог, а при
+    settings.QUERY_BUDGET_STRICT выбрасывает QueryBudgetExceeded.
+    Сессия и пользователь запроса загружаются до начала подсчёта: это
+    работа middleware, а не представления.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'user', None)
+            if user is not None:
+                user.is_authenticated
+            counter = QueryCounter()
+            # Чтения могут идти на реплику (core.routers).
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = view(request, *args, **kwargs)
+            if counter.count > limit:
+                message = (
+                    f'{view.__module__}.{view.__name__}: {counter.count} '
+                    f'запросов к БД при бюджете {limit} ({request.path})'
+                )
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
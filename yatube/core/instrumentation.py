@@ -0,0 +1,112 @@
+"""Замеры времени обработки запроса.
+
+ServerTimingMiddleware (core.middleware) создаёт на время запроса
+RequestMetrics и кладёт его в contextvar. Сюда же пишут шаблонный
+бэкенд core.template_backend (время рендеринга) и помощники кэша
+(попадания и промахи) через record_cache. Вне запроса current()
+возвращает None, и замеры ничего не стоят.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка для connection.execute_wrapper.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} SQL"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hit={self.cache_hits} miss={self.cache_misses}"',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 1),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def current():
+    return _current.get()
+
+
+def start():
+    """Начинает замеры запроса; возвращает их и токен для stop()."""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class SlowRequests:
+    """size самых медленных запросов процесса.
+
+    Хранятся в куче по времени: запрос быстрее самого быстрого из
+    сохранённых отбрасывается за O(1), остальные вытесняют его за
+    O(log size).
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._heap = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def record(self, total, entry):
+        item = (total, next(self._order), entry)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif total > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def snapshot(self):
+        """Сохранённые запросы, от самого медленного."""
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [entry for _, _, entry in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
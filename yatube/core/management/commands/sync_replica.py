@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import routers
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную БД SQLite в файлы реплик (DATABASE_REPLICAS) '
+        'через online backup API: сайт продолжает писать в основную БД, '
+        'а читатели реплики видят либо прежнюю копию, либо новую целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to', dest='paths', action='append', default=[],
+            help='Файл реплики вместо алиасов из DATABASE_REPLICAS.')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд; 0 - один раз.')
+
+    def handle(self, *args, **options):
+        aliases = self.replica_aliases()
+        paths = options['paths'] or list(aliases)
+        if not paths:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_REPLICA_DB или --to.')
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != 'sqlite':
+            raise CommandError('Копирование поддерживается только для SQLite.')
+        while True:
+            for path in paths:
+                started = time.monotonic()
+                self.copy(source, path)
+                if path in aliases:
+                    routers.synced(aliases[path])
+                self.stdout.write(
+                    f'{path}: {time.monotonic() - started:.2f} с')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def replica_aliases(self):
+        """{файл реплики: алиас} для DATABASE_REPLICAS."""
+        aliases = {}
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            if replica.vendor != 'sqlite':
+                raise CommandError(f'Реплика {alias} - не SQLite.')
+            aliases[replica.settings_dict['NAME']] = alias
+        return aliases
+
+    def copy(self, source, path):
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            # Все страницы за один шаг: копия согласована, и запись в
+            # основную БД во время копирования не заставит начать заново.
+            source.connection.backup(target)
+        finally:
+            target.close()
@@ -0,0 +1,255 @@
+"""Метрики в формате Prometheus, общие для всех процессов сервера.
+
+Каждый процесс копит значения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд записывает их в свой файл <pid>.json в
+METRICS_DIR: при очередном значении, из фонового потока, если процесс
+простаивает, и при выходе. Страница /metrics складывает файлы всех
+процессов, поэтому счётчики и гистограммы видны целиком, а не по
+одному воркеру. Все значения - накопленные суммы, так что файлы
+завершившихся процессов продолжают учитываться, как в
+multiprocess-режиме prometheus_client. Каталог и файлы создаются
+только для владельца процесса (0700 и 0600).
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 15, 2))
+
+_families = {}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._samples = {}
+        self._flushed = time.monotonic()
+        self._restored = False
+        self._dirty = False
+        self._flusher = None
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name='metrics-flush',
+            daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            # После fork и clear() поток заменяется новым.
+            if self._flusher is not threading.current_thread():
+                return
+            self.flush_pending()
+
+    def _restore(self, path):
+        # Файл с тем же pid мог остаться от завершившегося процесса:
+        # его значения продолжаем, а не затираем.
+        self._restored = True
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        for name, labels, value in data:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            self._samples[key] = self._samples.get(key, 0) + value
+
+    def add(self, samples):
+        """Прибавляет значения из пар ((имя, метки), число)."""
+        with self._lock:
+            if os.getpid() != self._pid:
+                # После fork значения родителя уже учтены в его файле.
+                self._reset()
+            for key, value in samples:
+                self._samples[key] = self._samples.get(key, 0) + value
+            self._dirty = True
+            if self._flusher is None:
+                self._start_flusher()
+            due = (
+                time.monotonic() - self._flushed
+                >= settings.METRICS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reset()
+            os.makedirs(settings.METRICS_DIR, mode=0o700, exist_ok=True)
+            path = os.path.join(settings.METRICS_DIR, f'{self._pid}.json')
+            if not self._restored:
+                self._restore(path)
+            data = [
+                [name, list(labels), value]
+                for (name, labels), value in self._samples.items()
+            ]
+            self._flushed = time.monotonic()
+            self._dirty = False
+            # Без O_NOFOLLOW подложенная ссылка .tmp перенаправила бы
+            # запись в чужой файл.
+            descriptor = os.open(
+                f'{path}.tmp',
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW,
+                0o600,
+            )
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(data, file)
+            os.replace(f'{path}.tmp', path)
+
+    def flush_pending(self):
+        """Записывает файл, если с прошлой записи были новые значения."""
+        with self._lock:
+            pending = self._dirty and os.getpid() == self._pid
+        if pending:
+            self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+
+registry = Registry()
+atexit.register(registry.flush_pending)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        _families[name] = ('counter', documentation)
+
+    def inc(self, amount=1, **labels):
+        registry.add([((f'{self.name}_total', _labels(labels)), amount)])
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=TIME_BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        _families[name] = ('histogram', documentation)
+
+    def observe(self, value, **labels):
+        key = _labels(labels)
+        samples = [
+            ((f'{self.name}_bucket', key + (('le', str(bound)),)), 1)
+            for bound in self.buckets
+            if value <= bound
+        ]
+        samples += [
+            ((f'{self.name}_bucket', key + (('le', '+Inf'),)), 1),
+            ((f'{self.name}_sum', key), value),
+            ((f'{self.name}_count', key), 1),
+        ]
+        registry.add(samples)
+
+
+def collect():
+    """Сумма значений всех процессов: {(имя, метки): число}."""
+    registry.flush()
+    totals = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _family(sample_name):
+    for suffix in ('_total', '_bucket', '_sum', '_count'):
+        if sample_name.endswith(suffix):
+            name = sample_name[:-len(suffix)]
+            if name in _families:
+                return name
+    return sample_name
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('\n', '\\n')
+        .replace('"', '\\"')
+    )
+
+
+def _sort_key(item):
+    (name, labels), _ = item
+    # Корзины гистограммы - по возрастанию границы, +Inf последней.
+    bound = dict(labels).get('le')
+    order = float('inf') if bound == '+Inf' else float(bound or 0)
+    return (
+        _family(name), name,
+        [pair for pair in labels if pair[0] != 'le'], order,
+    )
+
+
+def exposition():
+    """Текст для Prometheus (text exposition format 0.0.4)."""
+    lines = []
+    current = None
+    for (name, labels), value in sorted(collect().items(), key=_sort_key):
+        family = _family(name)
+        if family != current:
+            current = family
+            kind, documentation = _families.get(family, ('untyped', ''))
+            lines.append(f'# HELP {family} {documentation}')
+            lines.append(f'# TYPE {family} {kind}')
+        label_text = ','.join(
+            f'{key}="{_escape(label)}"' for key, label in labels)
+        if label_text:
+            label_text = '{' + label_text + '}'
+        lines.append(f'{name}{label_text} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Время обработки запроса по имени маршрута.',
+)
+DB_QUERIES = Counter(
+    'yatube_db_queries',
+    'Запросы к БД по имени маршрута.',
+)
+DB_QUERY_SECONDS = Counter(
+    'yatube_db_query_seconds',
+    'Время запросов к БД по имени маршрута.',
+)
+CACHE_HITS = Counter(
+    'yatube_cache_hits',
+    'Попадания в кэш страниц и карточек.',
+)
+CACHE_MISSES = Counter(
+    'yatube_cache_misses',
+    'Промахи кэша страниц и карточек.',
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_generation_seconds',
+    'Время создания миниатюры картинки поста.',
+)
+DB_LOCK_RETRIES = Counter(
+    'yatube_db_lock_retries',
+    'Повторы транзакций из-за блокировки SQLite.',
+)
+UPLOAD_BYTES = Histogram(
+    'yatube_upload_bytes',
+    'Размеры загруженных файлов.',
+    buckets=SIZE_BUCKETS,
+)
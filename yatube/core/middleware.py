@@ -0,0 +1,123 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from . import instrumentation, metrics, routers
+
+logger = logging.getLogger('core.requests')
+
+slow_requests = instrumentation.SlowRequests(settings.SLOW_REQUESTS_SIZE)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else ''
+
+
+class ServerTimingMiddleware:
+    """Замеряет запрос: SQL, шаблоны, кэш и общее время.
+
+    Результат уходит в заголовок Server-Timing, в лог core.requests
+    одной JSON-строкой, в метрики /metrics (core.metrics) и в список
+    самых медленных запросов процесса, который персонал видит на
+    странице core:slow_requests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings, token = instrumentation.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        timings.finish()
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing()
+        entry = {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view_name(request),
+            'status': response.status_code,
+            **timings.as_dict(),
+        }
+        slow_requests.record(timings.total, entry)
+        self.observe(entry['view'] or 'unmatched', timings)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(entry, ensure_ascii=False))
+        return response
+
+    def observe(self, view, timings):
+        metrics.REQUEST_DURATION.observe(timings.total, view=view)
+        metrics.DB_QUERIES.inc(timings.sql_count, view=view)
+        metrics.DB_QUERY_SECONDS.inc(timings.sql_time, view=view)
+        metrics.CACHE_HITS.inc(timings.cache_hits)
+        metrics.CACHE_MISSES.inc(timings.cache_misses)
+
+
+class WriteDetector:
+    """Обёртка для connection.execute_wrapper, замечающая запись."""
+
+    STATEMENTS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+
+    def __init__(self):
+        self.wrote = False
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.split(None, 1)[0].upper() in self.STATEMENTS:
+            self.wrote = True
+        return result
+
+
+class ReplicaMiddleware:
+    """Направляет чтения представлений REPLICA_READ_VIEWS на реплику.
+
+    Если запрос что-то записал в default, ставит cookie
+    REPLICA_STICKY_COOKIE: пока она жива, браузер читает из default и
+    видит свои изменения, которые ещё не дошли до реплики. Метод запроса
+    не важен: выход по GET пишет сессию, а отклонённая форма - нет.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        request._replica_token = None
+        writes = WriteDetector()
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(writes):
+                response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                routers._replica.reset(request._replica_token)
+        if writes.wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in ('GET', 'HEAD')
+                and view_name(request) in settings.REPLICA_READ_VIEWS
+                and settings.REPLICA_STICKY_COOKIE not in request.COOKIES):
+            alias = routers.choose()
+            if alias is not None:
+                # Сессия и пользователь читаются из default до
+                # переключения: свежий вход может ещё не дойти до реплики.
+                request.user.is_authenticated
+                request._replica_token = routers._replica.set(alias)
@@ -0,0 +1,181 @@
+"""Чтение объектов по уникальному ключу через кэш.
+
+Model.cached.get(slug=...) сначала смотрит в кэш, при промахе читает
+строку из БД и кладёт её в кэш. Отсутствующие объекты тоже кэшируются
+(на OBJECT_CACHE_MISS_TIMEOUT), поэтому поток запросов к несуществующим
+страницам не доходит до БД. Сохранение и удаление объекта удаляют его
+записи по всем ключам, в том числе по прежнему значению изменённого
+слага или имени. Записи удаляются и сразу, и после коммита транзакции.
+
+Связанные объекты (related) хранятся не в записи объекта, а в кэшах
+своих моделей, так что переименование группы не оставляет старое
+название в закэшированных постах. При промахе они загружаются тем же
+запросом (select_related).
+
+Строки читаются из default, даже если запрос читает с реплики
+(core.routers): отстающая копия попала бы в кэш для всех запросов.
+
+ObjectCache - не менеджер модели: он не становится _default_manager и
+не попадает в миграции, поэтому его можно добавить и к чужой модели,
+например к User.
+"""
+import copy
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.http import Http404
+
+from . import db
+
+# Отметка об отсутствии объекта: строка хранится в L1 без pickle.
+MISSING = 'object-cache:missing'
+
+
+def _detached(obj):
+    """Копия объекта без загруженных связанных объектов."""
+    clone = copy.copy(obj)
+    clone._state = copy.copy(obj._state)
+    clone._state.fields_cache = {}
+    return clone
+
+
+class ObjectCache:
+    def __init__(self, *fields, related=()):
+        self.fields = fields or ('pk',)
+        self.related = related
+        self.model = None
+
+    def contribute_to_class(self, model, name):
+        self.model = model
+        setattr(model, name, self)
+        uid = f'{model._meta.label_lower}.{name}'
+        pre_save.connect(self._remember, sender=model, weak=False,
+                         dispatch_uid=f'{uid}.remember')
+        post_save.connect(self._forget, sender=model, weak=False,
+                          dispatch_uid=f'{uid}.saved')
+        post_delete.connect(self._forget, sender=model, weak=False,
+                            dispatch_uid=f'{uid}.deleted')
+
+    def _field(self, name):
+        meta = self.model._meta
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+    def _key(self, name, value):
+        # Своё пространство ключей L1 у каждой модели (core.cache.tiered):
+        # вход пользователя не сбрасывает закэшированные посты.
+        return (
+            f'object.{self.model._meta.label_lower}:{name}:'
+            f'{quote(str(value))}'
+        )
+
+    def get(self, **kwargs):
+        if len(kwargs) != 1 or next(iter(kwargs)) not in self.fields:
+            raise TypeError(
+                f'Поиск только по одному из полей {self.fields}.')
+        (name, value), = kwargs.items()
+        value = self._field(name).to_python(value)
+        found = self.get_many([value], name)
+        if value not in found:
+            raise self.model.DoesNotExist(
+                f'{self.model._meta.object_name} matching query does not '
+                f'exist.')
+        return found[value]
+
+    def get_or_404(self, **kwargs):
+        try:
+            return self.get(**kwargs)
+        except self.model.DoesNotExist:
+            raise Http404(
+                f'Объект «{self.model._meta.verbose_name}» не найден.')
+
+    def get_many(self, values, name='pk'):
+        """Объекты по значениям поля name: {значение: объект}."""
+        to_python = self._field(name).to_python
+        keys = {self._key(name, value): value
+                for value in map(to_python, values)}
+        cached = cache.get_many(keys)
+        found = {
+            keys[key]: obj for key, obj in cached.items() if obj != MISSING
+        }
+        self._attach_related(found.values())
+        missing = [value for key, value in keys.items() if key not in cached]
+        if missing:
+            loaded = self._load(name, missing)
+            cache.set_many(
+                {self._key(name, value): MISSING
+                 for value in missing if value not in loaded},
+                settings.OBJECT_CACHE_MISS_TIMEOUT,
+            )
+            found.update(loaded)
+        return found
+
+    def _load(self, name, values):
+        queryset = (
+            self.model._default_manager.db_manager(DEFAULT_DB_ALIAS)
+            .filter(**{f'{name}__in': values})
+        )
+        if self.related:
+            queryset = queryset.select_related(*self.related)
+        loaded = {getattr(obj, name): obj for obj in queryset}
+        self.store(loaded.values())
+        for related_name in self.related:
+            field = self.model._meta.get_field(related_name)
+            field.related_model.cached.store(
+                getattr(obj, related_name) for obj in loaded.values()
+                if getattr(obj, field.attname) is not None
+            )
+        return loaded
+
+    def store(self, objects):
+        """Кладёт объекты в кэш по всем ключам."""
+        cache.set_many(
+            {key: _detached(obj)
+             for obj in objects for key in self._keys(obj)},
+            settings.OBJECT_CACHE_TIMEOUT,
+        )
+
+    def _attach_related(self, objects):
+        for name in self.related:
+            field = self.model._meta.get_field(name)
+            ids = {getattr(obj, field.attname) for obj in objects} - {None}
+            if not ids:
+                continue
+            related = field.related_model.cached.get_many(ids)
+            for obj in objects:
+                related_obj = related.get(getattr(obj, field.attname))
+                if related_obj is not None:
+                    setattr(obj, name, related_obj)
+
+    def _keys(self, instance):
+        return [
+            self._key(name, getattr(instance, name)) for name in self.fields
+        ]
+
+    def _remember(self, sender, instance, using, raw=False,
+                  update_fields=None, **kwargs):
+        # Ключи по прежним значениям полей (кроме pk): после
+        # переименования старый слаг не должен находить объект.
+        names = [name for name in self.fields if name != 'pk']
+        if update_fields is not None:
+            names = [name for name in names if name in update_fields]
+        instance._cached_old_keys = []
+        if not names or instance.pk is None or raw:
+            return
+        old = (
+            self.model._base_manager.db_manager(using)
+            .filter(pk=instance.pk).values(*names).first()
+        )
+        if old:
+            instance._cached_old_keys = [
+                self._key(name, value) for name, value in old.items()
+            ]
+
+    def _forget(self, sender, instance, using, **kwargs):
+        keys = set(self._keys(instance))
+        keys.update(getattr(instance, '_cached_old_keys', ()))
+        # И после коммита: другой запрос мог положить в кэш строку,
+        # прочитанную до него.
+        db.now_and_on_commit(lambda: cache.delete_many(keys), using)
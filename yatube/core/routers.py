@@ -0,0 +1,81 @@
+"""Чтение лент и страниц постов с реплик БД.
+
+ReplicaMiddleware выбирает реплику из DATABASE_REPLICAS для GET-запросов
+к представлениям из REPLICA_READ_VIEWS и кладёт её алиас в contextvar;
+ReplicaRouter отправляет туда чтения этого запроса. Запись всегда идёт в
+default.
+
+Реплика отстаёт от основной БД (см. команду sync_replica), поэтому после
+запроса, который действительно писал в БД, middleware ставит cookie, и
+REPLICA_STICKY_SECONDS запросы этого браузера читают из default: автор
+сразу видит свой пост и свою подписку.
+
+sync_replica после каждого копирования увеличивает позицию реплики в
+кэше (sync_position); по ней условный GET (posts.caching) отличает
+страницы разных копий.
+"""
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+_replica = contextvars.ContextVar('db_replica', default=None)
+
+
+def current():
+    """Алиас реплики текущего запроса или None."""
+    return _replica.get()
+
+
+@contextmanager
+def use_replica(alias):
+    token = _replica.set(alias)
+    try:
+        yield alias
+    finally:
+        _replica.reset(token)
+
+
+def choose():
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+def _sync_key(alias):
+    return f'replica-sync:{alias}'
+
+
+def sync_position(alias):
+    """Номер копии, которая сейчас лежит в реплике alias, или None."""
+    return cache.get(_sync_key(alias))
+
+
+def synced(alias):
+    """Отмечает, что реплика alias скопирована заново."""
+    key = _sync_key(alias)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Как и поколения страниц, потерянная позиция начинается с
+        # текущего времени, чтобы не совпасть с прежними.
+        cache.add(key, int(time.time() * 1000), None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default, объекты из них связываются свободно.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема попадает на реплику вместе с данными при копировании.
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,38 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+from django.template.backends.django import reraise
+
+from . import instrumentation
+
+
+class Template(DjangoTemplate):
+    def render(self, context=None, request=None):
+        metrics = instrumentation.current()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенные рендеры (карточки внутри ленты) уже входят во время
+        # внешнего шаблона.
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, сообщающий время рендеринга в instrumentation."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,684 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import stat
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts import caching
+from posts.models import Group, Post
+
+from . import auth, db, instrumentation, metrics, routers
+from .cache.sqlite import SQLiteCache
+from .cache.tiered import TieredCache
+from .middleware import ReplicaMiddleware, slow_requests
+
+User = get_user_model()
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        slow_requests.clear()
+        self.client = Client()
+
+    def timings(self, response):
+        return dict(
+            part.split(';', 1)
+            for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'tpl', 'cache', 'total'})
+        self.assertRegex(timings['db'], r'dur=[\d.]+;desc="[1-9]\d* SQL"')
+        self.assertIn('miss=', timings['cache'])
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('desc="0 SQL"', self.timings(response)['db'])
+        self.assertIn('hit=1', self.timings(response)['cache'])
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_log_line(self):
+        with self.assertLogs('core.requests', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'posts:index')
+        self.assertEqual(entry['status'], 200)
+        self.assertGreater(entry['sql_count'], 0)
+        self.assertGreaterEqual(entry['total_ms'], entry['template_ms'])
+
+    def test_slow_requests_page(self):
+        self.client.get(reverse('posts:index'))
+        url = reverse('core:slow_requests')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        paths = [entry['path'] for entry in response.context['requests']]
+        self.assertIn(reverse('posts:index'), paths)
+
+    def test_slow_requests_keeps_slowest(self):
+        log = instrumentation.SlowRequests(3)
+        for total in (5, 1, 9, 3, 7, 2):
+            log.record(total, {'total': total})
+        self.assertEqual([entry['total'] for entry in log.snapshot()],
+                         [9, 7, 5])
+
+    def test_record_cache_outside_request(self):
+        instrumentation.record_cache(hits=1)
+        self.assertIsNone(instrumentation.current())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.settings = override_settings(METRICS_DIR=self.dir)
+        self.settings.enable()
+        metrics.registry.clear()
+        cache.clear()
+
+    def tearDown(self):
+        self.settings.disable()
+        metrics.registry.clear()
+        shutil.rmtree(self.dir)
+
+    def scrape(self):
+        response = Client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode().splitlines()
+
+    def test_requests_are_exposed(self):
+        Client().get(reverse('posts:index'))
+        lines = self.scrape()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      lines)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            lines)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 1',
+            lines)
+        self.assertTrue(any(
+            line.startswith('yatube_db_queries_total{view="posts:index"}')
+            for line in lines))
+        self.assertIn('yatube_cache_misses_total 1', lines)
+
+    def test_processes_are_summed(self):
+        metrics.CACHE_HITS.inc(2)
+        other = [['yatube_cache_hits_total', [], 3]]
+        with open(os.path.join(self.dir, '999999999.json'), 'w') as file:
+            json.dump(other, file)
+        self.assertIn('yatube_cache_hits_total 5', self.scrape())
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0.05)
+    def test_idle_process_flushes(self):
+        """Значения попадают в файл и без следующего add."""
+        metrics.CACHE_HITS.inc()
+        path = os.path.join(self.dir, f'{os.getpid()}.json')
+        self.assertFalse(os.path.exists(path))
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with open(path) as file:
+            self.assertEqual(json.load(file),
+                             [['yatube_cache_hits_total', [], 1]])
+
+    def test_files_are_private(self):
+        directory = os.path.join(self.dir, 'metrics')
+        with override_settings(METRICS_DIR=directory):
+            metrics.CACHE_HITS.inc()
+            metrics.registry.flush()
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertNotEqual(
+            settings.METRICS_DIR,
+            os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics.UPLOAD_BYTES.observe(100 * 1024)
+        lines = self.scrape()
+        self.assertNotIn('yatube_upload_bytes_bucket{le="65536"} 1', lines)
+        self.assertIn('yatube_upload_bytes_bucket{le="262144"} 1', lines)
+        self.assertIn('yatube_upload_bytes_sum 102400', lines)
+
+
+def _increment(path, times):
+    cache = SQLiteCache(path, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', True))
+        self.assertIs(self.cache.get('new'), True)
+        self.cache.set_many({'x': 1, 'y': b'2'})
+        self.assertEqual(self.cache.get_many(['x', 'y', 'z']),
+                         {'x': 1, 'y': b'2'})
+        self.cache.delete_many(['x', 'key'])
+        self.assertEqual(self.cache.get_many(['x', 'y', 'key']), {'y': b'2'})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('y'))
+
+    def test_files_are_private(self):
+        """Каталог и файл кэша доступны только владельцу."""
+        path = os.path.join(self.dir, 'private', 'cache.sqlite3')
+        SQLiteCache(path, {}).set('session', 'data')
+        self.assertEqual(
+            stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+        for name in (path, f'{path}-wal'):
+            with self.subTest(name=name):
+                self.assertEqual(stat.S_IMODE(os.stat(name).st_mode), 0o600)
+
+    def test_tests_use_own_cache_file(self):
+        self.assertTrue(settings.CACHES['shared']['LOCATION'].startswith(
+            tempfile.gettempdir()))
+        self.assertNotEqual(
+            settings.CACHE_DIR, os.path.join(settings.BASE_DIR, '.cache'))
+
+    def test_expiration(self):
+        self.cache.set('key', 'value', 0.05)
+        self.cache.set('forever', 'value', None)
+        self.assertTrue(self.cache.has_key('key'))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'again'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_incr(self):
+        self.cache.set('number', 1)
+        self.assertEqual(self.cache.incr('number', 10), 11)
+        self.assertEqual(self.cache.decr('number'), 10)
+        self.cache.set('text', 'a')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_processes(self):
+        """Атомарный incr из нескольких процессов не теряет обновлений."""
+        self.cache.set('counter', 0)
+        processes = [
+            multiprocessing.Process(target=_increment, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.make_cache().get('counter'), 200)
+
+    def test_lru_eviction_by_size(self):
+        cache = self.make_cache(MAX_BYTES=10 * 1024)
+        cache.set('hot', b'x' * 1024)
+        for number in range(20):
+            # Чтение обновляет время доступа не чаще ACCESS_RESOLUTION,
+            # поэтому двигаем его прямо в таблице.
+            cache._connection().execute(
+                "UPDATE cache SET accessed = ? WHERE key = ':1:hot'",
+                (time.time() + 60,))
+            cache.set(f'key{number}', b'x' * 1024)
+        entries, size = cache._connection().execute(
+            'SELECT entries, bytes FROM cache_stats').fetchone()
+        self.assertLessEqual(size, 10 * 1024)
+        self.assertLess(entries, 21)
+        self.assertIsNotNone(cache.get('hot'))
+        self.assertIsNone(cache.get('key0'))
+        self.assertIsNotNone(cache.get('key19'))
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.shared = SQLiteCache(
+            os.path.join(self.dir, 'cache.sqlite3'), {})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_cache(self, **options):
+        """Отдельный L1 над общим L2 - как в другом процессе."""
+        cache = TieredCache('shared', {'OPTIONS': options})
+        cache._l2 = self.shared
+        return cache
+
+    def test_l1_hit_does_not_touch_l2(self):
+        cache = self.make_cache(EPOCH_CHECK_INTERVAL=60)
+        cache.set('gen', 7)
+        cache.set('page', {'posts': [1, 2]})
+        with mock.patch.object(self.shared, 'get',
+                               side_effect=AssertionError), \
+                mock.patch.object(self.shared, 'get_many',
+                                  side_effect=AssertionError):
+            self.assertEqual(cache.get('gen'), 7)
+            self.assertEqual(cache.get_many(['gen', 'page']),
+                             {'gen': 7, 'page': {'posts': [1, 2]}})
+
+    def test_mutable_values_are_not_shared(self):
+        cache = self.make_cache()
+        cache.set('page', {'posts': [1, 2]})
+        cache.get('page')['posts'].append(3)
+        self.assertEqual(cache.get('page'), {'posts': [1, 2]})
+
+    def test_miss_fills_l1_from_l2(self):
+        cache = self.make_cache(EPOCH_CHECK_INTERVAL=60)
+        cache.get('warmup')
+        self.shared.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.shared.delete('key')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertIsNone(cache.get('missing'))
+
+    def test_epoch_bump_invalidates_other_processes(self):
+        writer = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        reader = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        writer.set('gen:a', 1)
+        writer.set('gen:b', 'old')
+        self.assertEqual(reader.get('gen:a'), 1)
+        self.assertEqual(reader.get('gen:b'), 'old')
+        writer.incr('gen:a')
+        self.shared.set('gen:b', 'new')
+        self.assertEqual(reader.get('gen:a'), 2)
+        self.assertEqual(reader.get('gen:b'), 'new')
+        writer.delete('gen:b')
+        self.assertIsNone(reader.get('gen:b'))
+
+    def test_epoch_bump_keeps_other_namespaces(self):
+        """delete и incr сбрасывают в L1 только своё пространство ключей."""
+        writer = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        reader = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        writer.set('page:1', 'page')
+        writer.set('gen:a', 1)
+        self.assertEqual(reader.get('page:1'), 'page')
+        writer.incr('gen:a')
+        writer.delete('follows:1')
+        with mock.patch.object(self.shared, 'get',
+                               side_effect=AssertionError):
+            self.assertEqual(reader.get('page:1'), 'page')
+
+    def test_stale_until_epoch_check(self):
+        writer = self.make_cache()
+        reader = self.make_cache(EPOCH_CHECK_INTERVAL=60)
+        writer.set('gen:a', 1)
+        self.assertEqual(reader.get('gen:a'), 1)
+        writer.incr('gen:a')
+        self.assertEqual(reader.get('gen:a'), 1)
+        reader._epoch_checked -= 60
+        self.assertEqual(reader.get('gen:a'), 2)
+
+    def test_l1_timeout_and_size(self):
+        cache = self.make_cache(L1_TIMEOUT=0.05, L1_MAX_ENTRIES=3)
+        for number in range(5):
+            cache.set(f'key{number}', number)
+        self.assertEqual(len(cache._entries), 3)
+        self.assertNotIn(cache.make_key('key0'), cache._entries)
+        self.assertEqual(cache.get('key0'), 0)
+        time.sleep(0.1)
+        self.shared.set('key4', 'changed')
+        self.assertEqual(cache.get('key4'), 'changed')
+
+    def test_clear(self):
+        cache = self.make_cache()
+        other = self.make_cache(EPOCH_CHECK_INTERVAL=0)
+        cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+        self.assertIsNone(other.get('key'))
+
+
+class SQLiteSettingsTests(TestCase):
+    def test_pragmas(self):
+        connection.close()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64 * 1024)
+            cursor.execute('PRAGMA synchronous')
+            # 1 - NORMAL.
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @override_settings(DB_LOCKED_RETRIES=2, DB_LOCKED_BACKOFF=0)
+    def test_retry_on_locked(self):
+        calls = []
+
+        def func():
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        # TestCase держит транзакцию, поэтому выходим из неё на время.
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch.object(db.transaction, 'atomic'):
+            self.assertEqual(db.atomic_with_retry(func), 'ok')
+            self.assertEqual(len(calls), 3)
+            calls.clear()
+            with self.assertRaises(OperationalError):
+                db.atomic_with_retry(func, retries=1)
+            self.assertEqual(len(calls), 2)
+
+    def test_other_errors_are_not_retried(self):
+        func = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch.object(db.transaction, 'atomic'):
+            with self.assertRaises(OperationalError):
+                db.atomic_with_retry(func)
+        self.assertEqual(func.call_count, 1)
+
+    def test_inside_transaction_runs_once(self):
+        func = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            db.atomic_with_retry(func)
+        self.assertEqual(func.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaTests(TestCase):
+    def request(self, name, method='get', args=(), cookies=None):
+        url = reverse(name, args=args)
+        request = getattr(RequestFactory(), method)(url)
+        request.resolver_match = resolve(url)
+        request.user = AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return request
+
+    def setUp(self):
+        cache.clear()
+
+    def run_middleware(self, request, write=False):
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(routers.current())
+            if write:
+                Group.objects.create(title='Группа', slug='group')
+            response = HttpResponse()
+            response['ETag'] = '"abc"'
+            return response
+
+        middleware = ReplicaMiddleware(get_response)
+        response = middleware(request)
+        self.assertIsNone(routers.current())
+        return seen[0], response
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with routers.use_replica('replica'):
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+    def test_feed_reads_go_to_replica(self):
+        alias, response = self.run_middleware(self.request('posts:index'))
+        self.assertEqual(alias, 'replica')
+        self.assertEqual(response['ETag'], '"abc"')
+
+    def test_other_views_read_primary(self):
+        alias, response = self.run_middleware(self.request('posts:search'))
+        self.assertIsNone(alias)
+
+    def test_sticky_primary_after_write(self):
+        request = self.request('posts:add_comment', method='post', args=(1,))
+        _, response = self.run_middleware(request, write=True)
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        alias, _ = self.run_middleware(self.request(
+            'posts:index', cookies={settings.REPLICA_STICKY_COOKIE: '1'}))
+        self.assertIsNone(alias)
+
+    def test_sticky_depends_on_writes_not_method(self):
+        request = self.request('posts:add_comment', method='post', args=(1,))
+        _, response = self.run_middleware(request)
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        _, response = self.run_middleware(
+            self.request('users:logout'), write=True)
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_etag_follows_replica_position(self):
+        """304 для страницы реплики - пока на ней та же копия."""
+        request = self.request('posts:index')
+        primary = caching._etag(request, [1])
+        with routers.use_replica('replica'):
+            self.assertIsNone(caching._etag(request, [1]))
+            routers.synced('replica')
+            first = caching._etag(request, [1])
+            self.assertEqual(caching._etag(request, [1]), first)
+            routers.synced('replica')
+            second = caching._etag(request, [1])
+        self.assertNotIn(first, (None, primary, second))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        alias, response = self.run_middleware(self.request('posts:index'))
+        self.assertIsNone(alias)
+        request = self.request('posts:add_comment', method='post', args=(1,))
+        _, response = self.run_middleware(request, write=True)
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sync_replica_without_replicas(self):
+        with self.assertRaises(CommandError):
+            call_command('sync_replica', stdout=StringIO())
+
+
+class AfterCommitTests(TransactionTestCase):
+    def test_now_and_on_commit(self):
+        calls = []
+        db.now_and_on_commit(lambda: calls.append('now'))
+        self.assertEqual(calls, ['now'])
+        calls.clear()
+        with transaction.atomic():
+            db.now_and_on_commit(lambda: calls.append('now'))
+            self.assertEqual(calls, ['now'])
+        self.assertEqual(calls, ['now', 'now'])
+        calls.clear()
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                db.now_and_on_commit(lambda: calls.append('now'))
+                1 / 0
+        self.assertEqual(calls, ['now'])
+
+    def test_generations_change_after_commit(self):
+        """Страница, собранная до коммита, не используется после него."""
+        author = User.objects.create_user(username='author')
+        with transaction.atomic():
+            Post.objects.create(text='Пост', author=author)
+            seen = caching.get_generations(caching.ALL_POSTS)
+        self.assertNotEqual(
+            caching.get_generations(caching.ALL_POSTS), seen)
+
+    def test_object_cache_is_cleared_after_commit(self):
+        group = Group.objects.create(title='Старое', slug='group')
+        stale = Group.objects.get(pk=group.pk)
+        with transaction.atomic():
+            group.title = 'Новое'
+            group.save()
+            # Другой запрос читает строку до коммита и кэширует её.
+            Group.cached.store([stale])
+        self.assertEqual(Group.cached.get(pk=group.pk).title, 'Новое')
+
+
+class SyncReplicaTests(TransactionTestCase):
+    # Копирование ждёт, пока у основной БД нет открытой транзакции
+    # записи, поэтому данные теста должны быть закоммичены.
+
+    def test_sync_replica(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            call_command('sync_replica', paths=[path], stdout=StringIO())
+            replica = sqlite3.connect(path)
+            try:
+                count, = replica.execute(
+                    'SELECT count(*) FROM posts_post').fetchone()
+            finally:
+                replica.close()
+        self.assertEqual(count, Post.objects.count())
+
+
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_user_is_cached(self):
+        backend = auth.CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+        self.assertIsNone(backend.get_user(0))
+
+    def test_warm_request_has_no_identity_queries(self):
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['user'], self.user)
+        for query in queries:
+            with self.subTest(sql=query['sql']):
+                self.assertNotIn('django_session', query['sql'])
+                self.assertNotIn('FROM "auth_user" WHERE', query['sql'])
+
+    def test_new_logins_use_cache_and_old_sessions_stay(self):
+        self.user.set_password('password')
+        self.user.save()
+        client = Client()
+        client.login(username='reader', password='password')
+        self.assertEqual(client.session[BACKEND_SESSION_KEY],
+                         'core.auth.CachedModelBackend')
+        client = Client()
+        client.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend')
+        url = reverse('posts:follow_index')
+        self.assertEqual(client.get(url).status_code, 200)
+
+    def test_password_change_logs_out(self):
+        url = reverse('posts:follow_index')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertRedirects(
+            self.client.get(url), f'{reverse("users:login")}?next={url}')
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group)
+
+    def test_read_through(self):
+        self.assertEqual(Group.cached.get(slug='group'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(Group.cached.get(slug='group'), self.group)
+            self.assertEqual(Group.cached.get(pk=self.group.pk), self.group)
+
+    def test_related_objects_from_their_caches(self):
+        with self.assertNumQueries(1):
+            post = Post.cached.get(pk=str(self.post.pk))
+            self.assertEqual(post.author.username, 'author')
+        self.group.title = 'Новое название'
+        self.group.save()
+        with self.assertNumQueries(1):
+            post = Post.cached.get(pk=self.post.pk)
+            self.assertEqual(post.group.title, 'Новое название')
+            self.assertEqual(post.author, self.author)
+
+    def test_loads_from_primary_during_replica_reads(self):
+        """В кэш попадают строки default, а не отстающей реплики."""
+        # Алиаса нет в DATABASES: чтение с него выбросило бы ошибку.
+        with routers.use_replica('lagging'):
+            self.assertEqual(Post.cached.get(pk=self.post.pk), self.post)
+            with self.assertRaises(Group.DoesNotExist):
+                Group.cached.get(slug='absent')
+
+    def test_missing_objects_are_cached(self):
+        url = reverse('posts:profile', args=('nobody',))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        User.objects.create_user(username='nobody')
+        self.assertEqual(User.cached.get(username='nobody').username,
+                         'nobody')
+
+    def test_rename_forgets_old_key(self):
+        Group.cached.get(slug='group')
+        self.group.slug = 'renamed'
+        self.group.save()
+        with self.assertRaises(Group.DoesNotExist):
+            Group.cached.get(slug='group')
+        self.assertEqual(Group.cached.get(slug='renamed'), self.group)
+
+    def test_delete(self):
+        Post.cached.get(pk=self.post.pk)
+        post_id = self.post.pk
+        self.post.delete()
+        with self.assertRaises(Post.DoesNotExist):
+            Post.cached.get(pk=post_id)
+
+    def test_get_many(self):
+        other = Post.objects.create(text='Другой', author=self.author)
+        Post.cached.get(pk=self.post.pk)
+        with self.assertNumQueries(1):
+            found = Post.cached.get_many([self.post.pk, other.pk, 0])
+        self.assertEqual(found, {self.post.pk: self.post, other.pk: other})
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Post.cached.get_many(
+                [self.post.pk, other.pk, 0])), 2)
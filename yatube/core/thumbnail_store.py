@@ -0,0 +1,136 @@
+"""Расширения sorl-thumbnail для пакетной выдачи миниатюр.
+
+KVStore держит в памяти процесса LRU поверх общего кэша и таблицы
+thumbnail_kvstore и умеет загрузить ключи для целой страницы одним
+get_many. ThumbnailBackend.get_thumbnails использует это, чтобы найти
+миниатюры всех картинок страницы за один поход в кэш.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings as django_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .decorators import uncounted
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """cached_db-хранилище с LRU в памяти процесса.
+
+    Записи о миниатюрах после создания не меняются, поэтому копию в
+    процессе можно не сверять с общим кэшем. Отсутствие записи в LRU не
+    запоминается: миниатюру может создать другой процесс.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_size = getattr(
+            django_settings, 'THUMBNAIL_KVSTORE_LRU_SIZE', 1000)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_raw(self, key):
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                return self._local[key]
+        value = super()._get_raw(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def prefetch(self, image_files):
+        """Загружает в LRU записи image_files: get_many и один запрос."""
+        with self._lock:
+            keys = [
+                add_prefix(image_file.key) for image_file in image_files
+                if add_prefix(image_file.key) not in self._local
+            ]
+        if not keys:
+            return
+        found = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            from_db = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list('key', 'value')
+            )
+            if from_db:
+                self.cache.set_many(from_db, settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(from_db)
+        for key, value in found.items():
+            if value != cached_db_kvstore.EMPTY_VALUE:
+                self._remember(key, value)
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Создание миниатюры не входит в бюджет представления
+    (core.decorators.query_budget): на холодной картинке sorl создаёт её
+    прямо в запросе, и число запросов от представления не зависит.
+    Поиск готовых миниатюр (prefetch и KVStore) считается как обычно.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if file_:
+            cached = default.kvstore.get(
+                self._thumbnail_file(file_, geometry_string, options))
+            if cached:
+                return cached
+        with uncounted():
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _thumbnail_file(self, file_, geometry_string, options):
+        # Повторяет вычисление имени миниатюры из get_thumbnail.
+        source = ImageFile(file_)
+        options = dict(options)
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnails(self, files, geometry_string, **options):
+        """Миниатюры для списка картинок с одним обращением к кэшу."""
+        prefetch = getattr(default.kvstore, 'prefetch', None)
+        if prefetch is not None:
+            prefetch([
+                self._thumbnail_file(file_, geometry_string, options)
+                for file_ in files
+            ])
+        return [
+            self.get_thumbnail(file_, geometry_string, **options)
+            for file_ in files
+        ]
@@ -0,0 +1,45 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from . import metrics
+
+
+class OversizedUpload(UploadedFile):
+    """Файл больше MAX_UPLOAD_SIZE: содержимое отброшено, размер известен."""
+
+    def __init__(self, name, content_type, size, charset,
+                 content_type_extra=None):
+        super().__init__(BytesIO(), name, content_type, size, charset,
+                         content_type_extra)
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """Перестаёт принимать файл, как только он превысил MAX_UPLOAD_SIZE.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS: лишние части файла не доходят
+    до следующих обработчиков и не попадают ни в память, ни на диск.
+    Вместо файла в request.FILES оказывается OversizedUpload, и форма
+    отклоняет его по размеру.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        metrics.UPLOAD_BYTES.observe(self.received)
+        if self.received <= settings.MAX_UPLOAD_SIZE:
+            return None
+        return OversizedUpload(
+            self.file_name, self.content_type, self.received, self.charset,
+            self.content_type_extra,
+        )
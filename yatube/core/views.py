@@ -1,5 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from . import metrics as metrics_store
+from .middleware import slow_requests as slow_requests_log
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +16,19 @@ def csrf_failure(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def slow_requests(request):
+    context = {
+        'requests': slow_requests_log.snapshot(),
+        'title': 'Медленные запросы',
+    }
+    return render(request, 'core/slow_requests.html', context)
+
+
+def metrics(request):
+    return HttpResponse(
+        metrics_store.exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
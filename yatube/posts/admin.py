@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from . import fulltext
 from .models import Post
 from .models import Group
 
@@ -11,6 +13,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ['pub_date']
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        if not fulltext.terms(search_term):
+            return queryset, False
+        found = fulltext.matching_ids(search_term)
+        return queryset.filter(id__in=found), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
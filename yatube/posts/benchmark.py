@@ -0,0 +1,129 @@
+"""Замеры времени ответа страниц posts.urls на текущих данных.
+
+Используется командой run_benchmark после seed_benchmark. Каждый
+маршрут запрашивается сначала с пустым кэшем, затем repeat раз подряд,
+и для него сохраняются время первого ответа, медиана, 95-й перцентиль и
+число запросов к БД.
+"""
+import math
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Follow, Group, Post, UserStats
+from .urls import app_name, urlpatterns
+
+User = get_user_model()
+
+
+class Target:
+    """Запрос к маршруту: аргументы, параметры, пользователь."""
+
+    def __init__(self, args=(), params=None, user=None, method='get',
+                 prepare=None):
+        self.args = args
+        self.params = params or {}
+        self.user = user
+        self.method = method
+        self.prepare = prepare
+
+
+def _top(field):
+    return (
+        UserStats.objects.select_related('user')
+        .order_by(f'-{field}').first().user
+    )
+
+
+def targets():
+    """Запросы ко всем маршрутам posts.urls: {имя маршрута: Target}."""
+    author = _top('posts_count')
+    reader = _top('following_count')
+    if reader == author:
+        reader = User.objects.exclude(pk=author.pk).first()
+    staff, _ = User.objects.get_or_create(
+        username='benchmark-staff', defaults={'is_staff': True})
+    group = Group.objects.first()
+    post = Post.objects.filter(author=author).order_by('-pub_date').first()
+    word = post.text.split()[0]
+
+    def unfollow():
+        Follow.objects.filter(user=reader, author=author).delete()
+
+    def follow():
+        Follow.objects.get_or_create(user=reader, author=author)
+
+    return {
+        'index': Target(),
+        'group_list': Target(args=(group.slug,)),
+        'profile': Target(args=(author.username,)),
+        'post_detail': Target(args=(post.pk,)),
+        'search': Target(params={'q': word}),
+        'post_create': Target(user=author),
+        'post_edit': Target(args=(post.pk,), user=author),
+        'add_comment': Target(args=(post.pk,), params={'text': 'Замер'},
+                              user=reader, method='post'),
+        'export': Target(args=('posts',), params={'author': author.username},
+                         user=staff),
+        'follow_index': Target(user=reader),
+        'profile_follow': Target(args=(author.username,), user=reader,
+                                 prepare=unfollow),
+        'profile_unfollow': Target(args=(author.username,), user=reader,
+                                   prepare=follow),
+    }
+
+
+def _request(client, url, target):
+    if target.prepare:
+        target.prepare()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, target.method)(url, target.params)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elapsed = (time.perf_counter() - started) * 1000
+    return response.status_code, elapsed, len(queries)
+
+
+def measure(name, target, repeat):
+    client = Client()
+    if target.user:
+        client.force_login(target.user)
+    url = reverse(f'{app_name}:{name}', args=target.args)
+    cache.clear()
+    status, cold, cold_queries = _request(client, url, target)
+    timings, queries = [], []
+    for _ in range(repeat):
+        _, elapsed, count = _request(client, url, target)
+        timings.append(elapsed)
+        queries.append(count)
+    timings.sort()
+    return {
+        'url': url,
+        'status': status,
+        'cold_ms': round(cold, 2),
+        'cold_queries': cold_queries,
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[math.ceil(0.95 * len(timings)) - 1], 2),
+        'queries': max(queries),
+    }
+
+
+def run(repeat=5):
+    """Замеры всех маршрутов; маршрут без Target отмечается skipped."""
+    known = targets()
+    results = {}
+    for pattern in urlpatterns:
+        target = known.get(pattern.name)
+        if target is None:
+            results[pattern.name] = {'skipped': True}
+        else:
+            results[pattern.name] = measure(pattern.name, target, repeat)
+    return results
@@ -0,0 +1,56 @@
+"""Массовая загрузка данных мимо сигналов моделей.
+
+bulk_create не отправляет post_save, поэтому после загрузки нужно
+самим обновить счётчики и ленты подписок и сбросить кэш страниц.
+Индекс поиска обновляют триггеры БД.
+"""
+import contextlib
+from collections import Counter
+
+from django.db import transaction
+
+from . import caching, counters, timeline
+from .models import Post
+
+
+@contextlib.contextmanager
+def keep_pub_date():
+    """Не даёт auto_now_add перезаписать pub_date в bulk_create.
+
+    Меняет поле модели на время блока, поэтому годится только для
+    команд управления, но не для кода, работающего в запросах.
+    """
+    field = Post._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def last_post_id():
+    return Post.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+
+def posts_added(posts, after_id):
+    """Учитывает посты posts, вставленные bulk_create после поста
+    after_id: счётчики авторов и ленты подписчиков.
+
+    Вызывается в транзакции вставки, чтобы данные не расходились.
+    """
+    per_author = Counter(post.author_id for post in posts)
+    for author_id, added in per_author.items():
+        counters.change(author_id, posts_count=added)
+    timeline.fan_out_since(after_id or 0)
+
+
+def finish():
+    """Приводит денормализованные данные в соответствие с таблицами.
+
+    Ленты пересобираются в транзакции: до её завершения читатели видят
+    прежние, а не пустые.
+    """
+    with transaction.atomic():
+        counters.recount()
+        timeline.rebuild()
+    caching.bump(caching.ALL_POSTS, caching.SITE)
@@ -0,0 +1,283 @@
+"""Кэширование страниц по поколениям (версионированным ключам).
+
+У каждой области данных (все посты, группа, автор, пост) есть номер
+поколения в кэше. Ключ закэшированной страницы содержит поколения
+областей, от которых она зависит, поэтому при изменении данных
+достаточно увеличить поколение: старые страницы перестают
+использоваться сразу и сами вытесняются из кэша по таймауту.
+
+Пересборку страницы новой версии выполняет один запрос, взявший
+блокировку в кэше (cache.add); остальные в это время получают прежнюю
+версию, а если её нет - ждут готовую. Незадолго до таймаута страница
+пересобирается заранее с вероятностью, растущей к концу срока
+(вероятностное раннее истечение, XFetch), чтобы записи горячих страниц
+не пропадали из кэша одновременно у всех.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from core import db, routers
+from core.instrumentation import record_cache
+
+ALL_POSTS = 'posts'
+# Редкие изменения, которые видны на всех страницах: имена
+# пользователей, названия и слаги групп.
+SITE = 'site'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def index_scopes(request):
+    return [ALL_POSTS, SITE]
+
+
+def group_scopes(request, slug):
+    return [SITE, group_scope(slug)]
+
+
+def profile_scopes(request, username):
+    return [SITE, author_scope(username)]
+
+
+def search_scopes(request):
+    return [ALL_POSTS, SITE]
+
+
+def post_detail_scopes(request, post_id):
+    # Всего постов автора меняется с любым новым постом, поэтому
+    # страница поста зависит и от ALL_POSTS.
+    return [ALL_POSTS, SITE, post_scope(post_id)]
+
+
+def _key(scope):
+    # Слаги и имена пользователей бывают не ASCII.
+    return f'gen:{quote(scope)}'
+
+
+def _initial():
+    # Поколение, потерянное из кэша, начинается с текущего времени, а не
+    # с нуля, чтобы не совпасть со старыми ключами страниц.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial(), None)
+            found[key] = cache.get(key)
+        generations.append(found[key])
+    return generations
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = _key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial(), None)
+
+
+def bump(*scopes):
+    """Делает устаревшими все страницы, зависящие от scopes.
+
+    Внутри транзакции поколения меняются ещё раз после коммита: страница,
+    собранная другим запросом по данным до коммита, остаётся под
+    промежуточным поколением.
+    """
+    db.now_and_on_commit(lambda: _bump(scopes))
+
+
+def _etag(request, generations):
+    """ETag страницы этих поколений для пользователя запроса.
+
+    Для вошедшего пользователя в ETag входит и cookie CSRF: повторный
+    вход меняет её секрет, и форма комментария из страницы, полученной
+    ответом 304, уже не отправилась бы. Страница с реплики зависит ещё и
+    от того, какая копия на ней лежит (core.routers.sync_position); если
+    это неизвестно, ETag нет.
+    """
+    alias = routers.current()
+    if alias is not None:
+        position = routers.sync_position(alias)
+        if position is None:
+            return None
+        generations = [*generations, f'{alias}{position}']
+    raw = '.'.join(map(str, generations)) + f':{request.user.pk or 0}'
+    if request.user.is_authenticated:
+        raw += ':' + request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_keys(request, generations):
+    """Ключ страницы этих поколений и ключ указателя на последнюю."""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    user_id = request.user.pk or 0
+    generations = '.'.join(map(str, generations))
+    return f'page:{generations}:{user_id}:{path}', f'page:{user_id}:{path}'
+
+
+def _freeze(response):
+    """Неизменяемый снимок ответа: L1 (core.cache.tiered) хранит его без
+    pickle, и попадание не стоит распаковки."""
+    return response.status_code, tuple(response.items()), response.content
+
+
+def _thaw(frozen):
+    status, headers, content = frozen
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def _lock_key(key):
+    return f'lock:{key}'
+
+
+def _lock(key):
+    return cache.add(_lock_key(key), True, settings.PAGE_REBUILD_LOCK_TIMEOUT)
+
+
+def _unlock(key):
+    # Таймаут 0 просрочивает блокировку без delete, который сбросил бы
+    # ключи lock: в L1 всех процессов (см. core.cache.tiered).
+    cache.touch(_lock_key(key), 0)
+
+
+def _expires_early(built_at, duration, timeout):
+    """XFetch: чем дольше сборка и ближе таймаут, тем вероятнее True."""
+    beta = settings.PAGE_CACHE_EARLY_BETA
+    if timeout is None or not beta:
+        return False
+    gap = -duration * beta * math.log(1 - random.random())
+    return time.time() + gap >= built_at + timeout
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + settings.PAGE_REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _stale(key, latest_key):
+    """Прежняя версия страницы с её ETag или None."""
+    stale_key = cache.get(latest_key)
+    if stale_key is None or stale_key == key:
+        return None
+    entry = cache.get(stale_key)
+    if entry is None:
+        return None
+    response, etag = _thaw(entry[0]), entry[1]
+    if etag is not None:
+        # ETag прежних поколений: после пересборки клиент получит новую
+        # версию, а не 304 на устаревшую.
+        response['ETag'] = quote_etag(etag)
+    return response
+
+
+def _rebuild(render, key, latest_key, etag, timeout):
+    """Собирает страницу под блокировкой и кладёт её в кэш."""
+    started = time.monotonic()
+    try:
+        response = render()
+        if response.status_code == 200 and not response.streaming:
+            entry = (_freeze(response), etag, time.time(),
+                     time.monotonic() - started)
+            cache.set_many({key: entry, latest_key: key}, timeout)
+    finally:
+        _unlock(key)
+    return response
+
+
+def cache_page_by_generation(get_scopes, timeout=None):
+    """Кэширует ответ представления до смены поколений его областей.
+
+    get_scopes(request, *args, **kwargs) возвращает области, от которых
+    зависит страница. Ключ учитывает пользователя, так как шапка сайта
+    и кнопки подписки у всех разные. timeout по умолчанию -
+    PAGE_CACHE_TIMEOUT.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations = get_generations(
+                *get_scopes(request, *args, **kwargs))
+            key, latest_key = page_keys(request, generations)
+            page_timeout = (
+                settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout)
+            if routers.current() is not None:
+                # Данные реплики могут отставать от поколений.
+                page_timeout = min(page_timeout, settings.REPLICA_MAX_LAG)
+
+            def rebuild():
+                return _rebuild(
+                    lambda: view(request, *args, **kwargs), key, latest_key,
+                    _etag(request, generations), page_timeout,
+                )
+
+            entry = cache.get(key)
+            if entry is not None:
+                record_cache(hits=1)
+                frozen, _, built_at, duration = entry
+                if (_expires_early(built_at, duration, page_timeout)
+                        and _lock(key)):
+                    return rebuild()
+                return _thaw(frozen)
+            record_cache(misses=1)
+            if _lock(key):
+                return rebuild()
+            # Страницу уже собирает другой запрос.
+            response = _stale(key, latest_key)
+            if response is None:
+                entry = _wait_for(key)
+                response = _thaw(entry[0]) if entry else rebuild()
+            return response
+        return wrapper
+    return decorator
+
+
+def generation_etag(get_scopes):
+    """Условный GET по поколениям областей страницы.
+
+    ETag считается из поколений и пользователя без обращения к БД за
+    данными страницы, поэтому на совпавший If-None-Match ответ 304
+    отдаётся без выполнения представления и рендеринга шаблонов.
+    """
+    def etag_func(request, *args, **kwargs):
+        generations = get_generations(*get_scopes(request, *args, **kwargs))
+        return _etag(request, generations)
+
+    def decorator(view):
+        return vary_on_cookie(condition(etag_func=etag_func)(view))
+    return decorator
@@ -0,0 +1,80 @@
+"""Денормализованные счётчики постов, подписчиков и подписок."""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Follow, Post, UserStats
+
+User = get_user_model()
+
+FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def count(user_id):
+    """Считает значения счётчиков пользователя по таблицам."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def get(user):
+    """Счётчики пользователя; при отсутствии строки она создаётся."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user.pk, defaults=count(user.pk))
+        return stats
+
+
+def change(user_id, create=True, **deltas):
+    """Атомарно сдвигает счётчики user_id на deltas.
+
+    Если строки ещё нет и create=True, она создаётся по текущим данным,
+    которые уже учитывают изменение.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+    if not updated and create:
+        UserStats.objects.get_or_create(
+            user_id=user_id, defaults=count(user_id))
+
+
+def _group_counts(queryset, field):
+    return dict(
+        queryset.order_by().values(field).annotate(total=Count('id'))
+        .values_list(field, 'total')
+    )
+
+
+def recount():
+    """Пересчитывает счётчики всех пользователей.
+
+    Возвращает число строк, значения которых разошлись с данными.
+    """
+    posts = _group_counts(Post.objects.all(), 'author_id')
+    followers = _group_counts(Follow.objects.all(), 'author_id')
+    following = _group_counts(Follow.objects.all(), 'user_id')
+    existing = UserStats.objects.in_bulk()
+    to_create, to_update = [], []
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        values = {
+            'posts_count': posts.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        stats = existing.get(user_id)
+        if stats is None:
+            to_create.append(UserStats(user_id=user_id, **values))
+        elif any(getattr(stats, key) != value
+                 for key, value in values.items()):
+            for key, value in values.items():
+                setattr(stats, key, value)
+            to_update.append(stats)
+    UserStats.objects.bulk_create(to_create, batch_size=500)
+    UserStats.objects.bulk_update(to_update, FIELDS, batch_size=500)
+    return len(to_create) + len(to_update)
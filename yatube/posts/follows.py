@@ -0,0 +1,118 @@
+"""Подписки пользователей и их множества в кэше.
+
+following_ids(user_id) - frozenset id авторов, на которых подписан
+пользователь; при промахе читается одним запросом к default, даже если
+страница читает с реплики. По нему отвечают "подписан ли" страница
+профиля и лента подписок.
+
+follow и unfollow - один INSERT OR IGNORE (ON CONFLICT DO NOTHING) или
+DELETE без предварительной проверки: повторная подписка или отписка
+ничего не меняет. Сигналы на такие запросы не приходят, поэтому
+счётчики, ленту, поколения страниц и множество подписок обновляют
+followed и unfollowed; они же вызываются из сигналов при изменении
+Follow через ORM (админка, загрузка данных).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection
+
+from core import db
+
+from . import caching, counters, timeline
+from .models import Follow
+
+
+def _key(user_id):
+    return f'follows:{user_id}'
+
+
+def following_rows(user_id):
+    """Запрос id авторов, на которых подписан user_id."""
+    # Не с реплики: её отстающее множество осталось бы в кэше после
+    # подписки.
+    return (
+        Follow.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+        .values_list('author_id', flat=True)
+    )
+
+
+def following_ids(user_id):
+    """Множество id авторов, на которых подписан user_id."""
+    key = _key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        # frozenset неизменяем и хранится в L1 без pickle.
+        ids = frozenset(following_rows(user_id))
+        cache.set(key, ids, settings.FOLLOW_SET_TIMEOUT)
+    return ids
+
+
+def is_following(user, author_id):
+    return (
+        user.is_authenticated
+        and author_id in following_ids(user.pk)
+    )
+
+
+def forget(user_id):
+    # И после коммита, как и caching.bump.
+    key = _key(user_id)
+    db.now_and_on_commit(lambda: cache.delete(key))
+
+
+def _changed(user, author):
+    forget(user.pk)
+    caching.bump(caching.author_scope(author.username),
+                 caching.author_scope(user.username))
+
+
+def followed(user, author):
+    """Обновляет всё, что зависит от новой подписки user на author."""
+    counters.change(author.pk, followers_count=1)
+    counters.change(user.pk, following_count=1)
+    timeline.backfill(user.pk, author.pk)
+    _changed(user, author)
+
+
+def unfollowed(user, author):
+    counters.change(author.pk, create=False, followers_count=-1)
+    counters.change(user.pk, create=False, following_count=-1)
+    timeline.remove(user.pk, author.pk)
+    _changed(user, author)
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def follow(user, author):
+    """Подписывает user на author; False, если подписка уже была."""
+    ops = connection.ops
+
+    def insert():
+        created = _execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{Follow._meta.db_table} (user_id, author_id) VALUES (%s, %s) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [user.pk, author.pk],
+        ) > 0
+        if created:
+            followed(user, author)
+        return created
+    return db.atomic_with_retry(insert)
+
+
+def unfollow(user, author):
+    """Отписывает user от author; False, если подписки не было."""
+    def delete():
+        deleted = _execute(
+            f'DELETE FROM {Follow._meta.db_table} '
+            f'WHERE user_id = %s AND author_id = %s',
+            [user.pk, author.pk],
+        ) > 0
+        if deleted:
+            unfollowed(user, author)
+        return deleted
+    return db.atomic_with_retry(delete)
@@ -1,5 +1,7 @@
 from django import forms
+from django.conf import settings
 
+from . import images
 from .models import Post, Comment
 
 
@@ -8,6 +10,24 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файл, отброшенный MaxSizeUploadHandler, пуст, и ImageField
+        # назвал бы его повреждённым. Проверяем его размер в clean_image.
+        name = self.add_prefix('image')
+        self.oversized_image = None
+        upload = self.files.get(name)
+        if upload is not None and upload.size > settings.MAX_UPLOAD_SIZE:
+            self.files = self.files.copy()
+            self.oversized_image = self.files.pop(name)[0]
+
+    def clean_image(self):
+        image = self.oversized_image or self.cleaned_data.get('image')
+        if image and image is not self.initial.get('image'):
+            images.check(image)
+            image = images.prepare(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,80 @@
+"""Полнотекстовый поиск постов.
+
+В SQLite поиск идёт по индексу FTS5 (модель SearchEntry) и выдача
+сортируется по bm25. На других СУБД индекса нет, и посты ищутся
+через LIKE по каждому слову запроса.
+"""
+import re
+
+from django.db import connection
+
+from .models import Post, SearchEntry
+from .paginator import InvalidCursor, KeysetPaginator, paginate
+
+WORD_RE = re.compile(r'\w+')
+MAX_TERMS = 10
+
+
+class SearchPaginator(KeysetPaginator):
+    """Выдача по возрастанию rank (лучшие первыми), курсор - (rank, id)."""
+    keys = ('rank', 'post_id')
+    descending = False
+
+    def encode(self, rank, pk):
+        return f'{rank!r}:{pk}'
+
+    def decode(self, cursor):
+        try:
+            rank, pk = cursor.split(':')
+            return float(rank), int(pk)
+        except ValueError:
+            raise InvalidCursor(cursor)
+
+    def prepare(self, rows):
+        return [entry.post for entry in rows]
+
+
+def terms(query):
+    return WORD_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def fts_query(query):
+    """Запрос FTS5 из пользовательского ввода.
+
+    Каждое слово берётся в кавычки и ищется по началу ("пост"* найдёт и
+    "посты"), поэтому операторы и синтаксис FTS5 из ввода не действуют.
+    """
+    return ' '.join(f'"{term}"*' for term in terms(query))
+
+
+def is_indexed():
+    return connection.vendor == 'sqlite'
+
+
+def matching_ids(query):
+    """Подзапрос id постов, найденных по запросу."""
+    if is_indexed():
+        return SearchEntry.objects.filter(
+            text__match=fts_query(query)).values('post_id')
+    posts = Post.objects.all()
+    for term in terms(query):
+        posts = posts.filter(text__icontains=term)
+    return posts.values('id')
+
+
+def entries(query):
+    """Записи индекса FTS5, найденные по запросу, вместе с постами."""
+    return (
+        SearchEntry.objects
+        .filter(text__match=fts_query(query))
+        .select_related('post__author', 'post__group')
+    )
+
+
+def get_page(request, query, per_page):
+    """Страница выдачи по запросу query."""
+    if is_indexed():
+        return paginate(request, entries(query), per_page, SearchPaginator)
+    posts = Post.objects.filter(id__in=matching_ids(query))
+    return paginate(request, posts.select_related('author', 'group'),
+                    per_page)
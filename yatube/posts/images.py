@@ -0,0 +1,149 @@
+"""Приём картинок постов.
+
+Формат и размеры проверяются по заголовку файла, который уже разобрал
+forms.ImageField, без декодирования пикселей. Большие картинки
+уменьшаются и пережимаются в пуле процессов, чтобы декодирование не
+раздувало память процесса веб-сервера; в MEDIA_ROOT/posts/ попадает уже
+уменьшенный файл. Маленькие картинки сохраняются как есть.
+
+Процессы пула запускаются через forkserver (или spawn), а не fork: в
+процессе сервера уже работают потоки миниатюр и метрик. Если процесс
+пула умер (например, его убил OOM killer на огромной картинке), пул
+заменяется новым и картинка обрабатывается ещё раз.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _start_method():
+    methods = multiprocessing.get_all_start_methods()
+    return 'forkserver' if 'forkserver' in methods else 'spawn'
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.POST_IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context(_start_method()),
+            )
+        return _executor
+
+
+def _replace_executor(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _shrink_in_pool(args):
+    # Вторая попытка - в новом пуле; если умер и он, дело в картинке.
+    for _ in range(2):
+        executor = get_executor()
+        try:
+            return executor.submit(shrink, *args).result()
+        except BrokenProcessPool:
+            _replace_executor(executor)
+    raise ValidationError(
+        'Не удалось обработать картинку.', code='processing_failed')
+
+
+def check(upload):
+    """Отклоняет слишком большие файлы, картинки и чужие форматы."""
+    if upload.size > settings.MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.MAX_UPLOAD_SIZE)},
+        )
+    image = getattr(upload, 'image', None)
+    if image is None:
+        return
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Поддерживаются только JPEG, PNG, GIF и WebP.',
+            code='invalid_format',
+        )
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def needs_shrinking(upload):
+    image = upload.image
+    if getattr(image, 'is_animated', False):
+        # Анимацию не пересобираем, её ограничивает только размер файла.
+        return False
+    return (
+        max(image.size) > settings.POST_IMAGE_MAX_SIDE
+        or upload.size > settings.POST_IMAGE_RECOMPRESS_SIZE
+    )
+
+
+def shrink(source, max_side, quality, max_pixels):
+    """Уменьшает картинку до max_side по большей стороне.
+
+    Выполняется в процессе пула: source - путь к временному файлу
+    загрузки или её содержимое. Возвращает байты в исходном формате.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    with Image.open(source) as image:
+        image_format = image.format
+        # Для JPEG декодер сразу уменьшает картинку в 2-8 раз.
+        image.draft(image.mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        result = BytesIO()
+        image.save(result, image_format, quality=quality, optimize=True)
+    return result.getvalue()
+
+
+def prepare(upload):
+    """Картинка для сохранения: исходный файл или уменьшенная копия."""
+    if not isinstance(upload, UploadedFile) or not needs_shrinking(upload):
+        return upload
+    if hasattr(upload, 'temporary_file_path'):
+        source = upload.temporary_file_path()
+    else:
+        upload.seek(0)
+        source = upload.read()
+    args = (
+        source,
+        settings.POST_IMAGE_MAX_SIDE,
+        settings.POST_IMAGE_QUALITY,
+        settings.POST_IMAGE_MAX_PIXELS,
+    )
+    if settings.POST_IMAGE_WORKERS:
+        content = _shrink_in_pool(args)
+    else:
+        content = shrink(*args)
+    if (len(content) >= upload.size
+            and max(upload.image.size) <= settings.POST_IMAGE_MAX_SIDE):
+        return upload
+    return ContentFile(content, name=upload.name)
@@ -0,0 +1,194 @@
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.db.models import F
+
+from core import db
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+# Режимы: как было (без прагм, соединение на запрос, без повторов) и с
+# настройками core.db.
+MODES = (('default', False), ('tuned', True))
+
+
+def create_post(alias, rng, users):
+    author = rng.choice(users)
+    # Как в представлениях: транзакция начинается с чтения.
+    User.objects.using(alias).get(pk=author)
+    Post.objects.using(alias).bulk_create(
+        [Post(text='Текст поста', author_id=author)])
+    UserStats.objects.using(alias).filter(user_id=author).update(
+        posts_count=F('posts_count') + 1)
+
+
+def create_comment(alias, rng, users):
+    post_id = (
+        Post.objects.using(alias).order_by('-pk')
+        .values_list('pk', flat=True).first()
+    )
+    Comment.objects.using(alias).bulk_create([Comment(
+        post_id=post_id, author_id=rng.choice(users), text='Комментарий')])
+
+
+def follow(alias, rng, users):
+    user, author = rng.sample(users, 2)
+    # Как posts.follows.follow, но без сигналов: они пишут в основную БД.
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {Follow._meta.db_table} '
+            f'(user_id, author_id) VALUES (%s, %s)', [user, author])
+        if not cursor.rowcount:
+            return
+    stats = UserStats.objects.using(alias)
+    stats.filter(user_id=user).update(
+        following_count=F('following_count') + 1)
+    stats.filter(user_id=author).update(
+        followers_count=F('followers_count') + 1)
+
+
+OPERATIONS = (create_post, create_comment, follow)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность записи в SQLite под '
+        'параллельной нагрузкой (посты, комментарии, подписки) без '
+        'настроек core.db и с ними. Замер идёт во временных файлах БД, '
+        'рабочая БД не меняется.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument(
+            '--seconds', type=float, default=10,
+            help='Длительность нагрузки в каждом режиме.')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='yatube-writes-')
+        report = {
+            'threads': options['threads'],
+            'seconds': options['seconds'],
+            'modes': {},
+        }
+        try:
+            for mode, tuned in MODES:
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                result = self.run_mode(mode, path, tuned, options)
+                report['modes'][mode] = result
+                self.stdout.write(
+                    f'{mode}: {result["ops_per_sec"]} операций/с, '
+                    f'ошибок блокировки {result["locked"]}, '
+                    f'p95 {result["p95_ms"]} мс')
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        default = report['modes']['default']['ops_per_sec']
+        if default:
+            report['speedup'] = round(
+                report['modes']['tuned']['ops_per_sec'] / default, 2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Прирост: ×{report["speedup"]}'))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def run_mode(self, mode, path, tuned, options):
+        alias = f'benchmark_writes_{mode}'
+        connections.databases[alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+        }
+        if not tuned:
+            connection_created.disconnect(
+                dispatch_uid='core.configure_connection')
+        try:
+            call_command('migrate', database=alias, verbosity=0,
+                         interactive=False)
+            users = self.seed(alias, options['users'])
+            return self.load(alias, users, tuned, options)
+        finally:
+            connections[alias].close()
+            del connections.databases[alias]
+            if not tuned:
+                connection_created.connect(
+                    db.configure_connection,
+                    dispatch_uid='core.configure_connection')
+
+    def seed(self, alias, count):
+        User.objects.using(alias).bulk_create(
+            User(username=f'writer{number}', password='!')
+            for number in range(count)
+        )
+        users = list(User.objects.using(alias).values_list('pk', flat=True))
+        UserStats.objects.using(alias).bulk_create(
+            UserStats(user_id=user) for user in users)
+        Post.objects.using(alias).bulk_create(
+            [Post(text='Первый пост', author_id=users[0])])
+        connections[alias].close()
+        return users
+
+    def load(self, alias, users, tuned, options):
+        deadline = time.monotonic() + options['seconds']
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            futures = [
+                executor.submit(self.worker, alias, users, tuned, deadline,
+                                seed)
+                for seed in range(options['threads'])
+            ]
+            results = [future.result() for future in futures]
+        timings = sorted(
+            timing for _, _, worker_timings in results
+            for timing in worker_timings
+        )
+        done = sum(result[0] for result in results)
+        return {
+            'ops': done,
+            'locked': sum(result[1] for result in results),
+            'ops_per_sec': round(done / options['seconds'], 1),
+            'median_ms': round(statistics.median(timings), 2)
+            if timings else None,
+            'p95_ms': round(timings[math.ceil(0.95 * len(timings)) - 1], 2)
+            if timings else None,
+        }
+
+    def worker(self, alias, users, tuned, deadline, seed):
+        rng = random.Random(seed)
+        done = locked = 0
+        timings = []
+        try:
+            while time.monotonic() < deadline:
+                operation = rng.choice(OPERATIONS)
+                started = time.perf_counter()
+                try:
+                    db.atomic_with_retry(
+                        lambda: operation(alias, rng, users),
+                        using=alias, retries=None if tuned else 0,
+                    )
+                except OperationalError as error:
+                    if not db.is_locked(error):
+                        raise
+                    locked += 1
+                else:
+                    done += 1
+                    timings.append((time.perf_counter() - started) * 1000)
+                if not tuned:
+                    # Как при CONN_MAX_AGE = 0: соединение на запрос.
+                    connections[alias].close()
+        finally:
+            connections[alias].close()
+        return done, locked, timings
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок по существующим подпискам.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'))
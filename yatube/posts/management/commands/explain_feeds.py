@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import query_plans
+
+
+class Command(BaseCommand):
+    help = 'Выводит EXPLAIN QUERY PLAN для запросов лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если запрос идёт мимо индекса.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(query_plans.report())
+        if options['check']:
+            failed = [
+                name for name, queryset in query_plans.feed_queries()
+                if query_plans.problems(queryset.explain(), name)
+            ]
+            if failed:
+                raise CommandError(
+                    'Запросы без индекса: ' + ', '.join(failed))
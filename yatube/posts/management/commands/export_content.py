@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии или подписки в JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(export.KINDS))
+        parser.add_argument(
+            '--format', choices=sorted(export.FORMATS), default='jsonl')
+        parser.add_argument('--author', help='username автора.')
+        parser.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--since', help='Начало периода: дата или дата-время ISO 8601.')
+        parser.add_argument('--until', help='Конец периода.')
+        parser.add_argument(
+            '--output', help='Файл для выгрузки; по умолчанию - stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            lines = export.stream(
+                options['kind'],
+                options['format'],
+                author=options['author'],
+                group=options['group'],
+                since=options['since'],
+                until=options['until'],
+            )
+        except export.ExportError as error:
+            raise CommandError(error)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
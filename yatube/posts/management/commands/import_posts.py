@@ -0,0 +1,154 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import bulk, caching
+from posts.models import Group, ImportCheckpoint, Post
+
+User = get_user_model()
+
+
+class RowError(Exception):
+    pass
+
+
+def parse_json(line):
+    if not line.strip():
+        raise RowError('пустая строка')
+    try:
+        return json.loads(line)
+    except ValueError as error:
+        raise RowError(f'неверный JSON: {error}')
+
+
+def lookup(ids, key, name):
+    try:
+        return ids[key]
+    except (KeyError, TypeError):
+        raise RowError(f'нет {name} {key!r}')
+
+
+def parse_pub_date(value):
+    try:
+        pub_date = parse_datetime(str(value))
+    except ValueError:
+        pub_date = None
+    if pub_date is None:
+        raise RowError(f'неверная дата {value!r}')
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date, timezone.utc)
+    return pub_date
+
+
+# Формат: (чтение строк из файла, разбор строки в словарь).
+READERS = {
+    'jsonl': (iter, parse_json),
+    'csv': (csv.DictReader, dict),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из JSONL или CSV с полями text, author '
+        '(username), group (slug), pub_date (ISO 8601) и image.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с постами.')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла; по умолчанию - по расширению.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Постов в одном INSERT.')
+        parser.add_argument(
+            '--transaction-size', type=int, default=20000,
+            help='Строк файла в одной транзакции.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, сохранённого в контрольной точке.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1][1:]
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        self.checkpoint = os.path.abspath(path)
+        checkpoints = ImportCheckpoint.objects.filter(path=self.checkpoint)
+        skip = 0
+        if options['resume']:
+            skip = checkpoints.values_list('position', flat=True).first() or 0
+        self.authors = dict(User.objects.values_list('username', 'id'))
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.now = timezone.now()
+
+        started = time.monotonic()
+        done = imported = failed = 0
+        with open(path, newline='', encoding='utf-8') as file:
+            read, self.parse = READERS[file_format]
+            rows = itertools.islice(read(file), skip, None)
+            while True:
+                chunk = list(
+                    itertools.islice(rows, options['transaction_size']))
+                if not chunk:
+                    break
+                posts = []
+                for number, row in enumerate(chunk, skip + done + 1):
+                    try:
+                        posts.append(self.build(row))
+                    except RowError as error:
+                        failed += 1
+                        self.stderr.write(f'Строка {number}: {error}')
+                done += len(chunk)
+                self.save(posts, skip + done, options)
+                imported += len(posts)
+                caching.bump(caching.ALL_POSTS, caching.SITE)
+                self.report(done, started)
+        checkpoints.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {imported}, пропущено строк: {failed}'))
+        self.report(done, started)
+
+    def save(self, posts, position, options):
+        """Вставляет посты части файла, обновляет счётчики и ленты только
+        по ним и запоминает позицию - всё в одной транзакции."""
+        with transaction.atomic(), bulk.keep_pub_date():
+            after_id = bulk.last_post_id()
+            Post.objects.bulk_create(posts, batch_size=options['batch_size'])
+            bulk.posts_added(posts, after_id)
+            ImportCheckpoint.objects.update_or_create(
+                path=self.checkpoint, defaults={'position': position})
+
+    def report(self, done, started):
+        elapsed = max(time.monotonic() - started, sys.float_info.epsilon)
+        self.stdout.write(
+            f'Обработано строк: {done}, {done / elapsed:.0f} строк/с')
+
+    def build(self, line):
+        row = self.parse(line)
+        if not isinstance(row, dict):
+            raise RowError('ожидался объект')
+        if not row.get('text'):
+            raise RowError('нет текста')
+        group_id = None
+        if row.get('group'):
+            group_id = lookup(self.groups, row['group'], 'группы')
+        pub_date = self.now
+        if row.get('pub_date'):
+            pub_date = parse_pub_date(row['pub_date'])
+        return Post(
+            text=row['text'],
+            author_id=lookup(self.authors, row.get('author'), 'автора'),
+            group_id=group_id,
+            pub_date=pub_date,
+            image=row.get('image') or '',
+        )
@@ -0,0 +1,51 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import metrics
+from posts import thumbnails
+from posts.models import Post
+
+
+def _generate(name):
+    try:
+        thumbnails.generate(name)
+    except Exception as error:
+        return name, str(error)
+    finally:
+        # Процесс пула может завершиться раньше очередной записи метрик.
+        metrics.registry.flush()
+    return name, None
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 - без пула, в текущем процессе.')
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct()
+        )
+        started = time.monotonic()
+        if options['workers']:
+            # Дочерние процессы не должны делить соединение с родителем.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                results = list(pool.map(_generate, names, chunksize=8))
+        else:
+            results = [_generate(name) for name in names]
+        failed = [(name, error) for name, error in results if error]
+        for name, error in failed:
+            self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр: {len(names) - len(failed)}, ошибок: {len(failed)}, '
+            f'{time.monotonic() - started:.1f} с'
+        ))
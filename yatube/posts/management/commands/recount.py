@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписчиков и подписок.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = counters.recount()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено строк: {fixed}'))
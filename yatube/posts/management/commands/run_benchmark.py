@@ -0,0 +1,75 @@
+import datetime
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment,
+)
+
+from core.apps import keep_caches
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа всех страниц posts на синтетических данных '
+        'нескольких размеров. Данные создаются в отдельной тестовой БД '
+        'с временным кэшем (см. CACHE_DIR), рабочие БД и кэш не меняются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000',
+            help='Числа постов через запятую.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default='benchmark.json')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        report = {
+            'created': datetime.datetime.now().isoformat(),
+            'repeat': options['repeat'],
+            'runs': [],
+        }
+        setup_test_environment()
+        try:
+            for size in sizes:
+                report['runs'].append(self.run_size(size, options['repeat']))
+        finally:
+            teardown_test_environment()
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'))
+
+    def run_size(self, size, repeat):
+        dataset = {
+            'posts': size,
+            'users': max(size // 50, 20),
+            'groups': max(size // 5000, 3),
+            'comments': size // 2,
+            'follows': 20,
+        }
+        self.stdout.write(f'Данные: {dataset}')
+        old_name = connection.settings_dict['NAME']
+        # Кэш и так временный, а холодные замеры очищают его сами
+        # (benchmark.measure).
+        with keep_caches():
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('seed_benchmark', stdout=StringIO(), **dataset)
+            results = benchmark.run(repeat)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        for name, result in results.items():
+            if result.get('skipped'):
+                self.stdout.write(f'  {name}: пропущен')
+            else:
+                self.stdout.write(
+                    f'  {name}: {result["median_ms"]} мс, '
+                    f'запросов {result["queries"]}')
+        return {'dataset': dataset, 'urls': results}
@@ -0,0 +1,191 @@
+import datetime
+import itertools
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import bulk
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса: k-й по популярности получает 1 / k^exponent."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def batches(total, size):
+    for start in range(0, total, size):
+        yield min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетические данные для замеров: пользователей, группы, '
+        'посты (авторы распределены по закону Ципфа), подписки и '
+        'комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя.')
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения постов и подписчиков по авторам.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты постов.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён пользователей и слагов групп.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                f'укажите другой --prefix.')
+        started = time.monotonic()
+        with transaction.atomic():
+            users = self.stage('Пользователи', self.create_users,
+                               prefix, options['users'])
+            groups = self.stage('Группы', self.create_groups,
+                                prefix, options['groups'])
+            # Авторы упорядочены по популярности: первым достаётся
+            # больше всего постов и подписчиков.
+            popularity = zipf_weights(len(users), options['zipf'])
+            posts = self.stage(
+                'Посты', self.create_posts, users, popularity, groups,
+                options['posts'], options['days'])
+            self.stage('Подписки', self.create_follows, users, popularity,
+                       options['follows'])
+            self.stage('Комментарии', self.create_comments, users, posts,
+                       options['comments'])
+            self.stage('Счётчики, ленты и кэш', bulk.finish)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def stage(self, name, func, *args):
+        started = time.monotonic()
+        result = func(*args)
+        self.stdout.write(f'{name}: {time.monotonic() - started:.1f} с')
+        return result
+
+    def create_users(self, prefix, count):
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{prefix}{number}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(
+            User.objects.filter(username__startswith=prefix)
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_groups(self, prefix, count):
+        Group.objects.bulk_create(
+            Group(
+                title=self.fake.catch_phrase(),
+                slug=f'{prefix}-{number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(count)
+        )
+        return list(
+            Group.objects.filter(slug__startswith=f'{prefix}-')
+            .values_list('id', flat=True)
+        )
+
+    def create_posts(self, users, popularity, groups, count, days):
+        # Faker медленный, поэтому тексты берутся из заранее созданного
+        # набора.
+        texts = [
+            self.fake.paragraph(nb_sentences=self.random.randint(1, 6))
+            for _ in range(500)
+        ]
+        now = timezone.now()
+        seconds = days * 24 * 60 * 60
+        last_id = Post.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        with bulk.keep_pub_date():
+            for size in batches(count, self.batch_size):
+                authors = self.random.choices(
+                    users, cum_weights=popularity, k=size)
+                Post.objects.bulk_create(
+                    Post(
+                        text=self.random.choice(texts),
+                        author_id=author_id,
+                        group_id=(
+                            self.random.choice(groups)
+                            if groups and self.random.random() < 0.7
+                            else None
+                        ),
+                        pub_date=now - datetime.timedelta(
+                            seconds=self.random.randrange(seconds)),
+                    )
+                    for author_id in authors
+                )
+        return list(
+            Post.objects.filter(id__gt=last_id)
+            .values_list('id', flat=True)
+        )
+
+    def create_follows(self, users, popularity, per_user):
+        per_user = min(per_user, len(users) - 1)
+        follows = []
+        for user_id in users:
+            authors = set()
+            while len(authors) < per_user:
+                author_id, = self.random.choices(
+                    users, cum_weights=popularity)
+                if author_id != user_id:
+                    authors.add(author_id)
+            follows += [
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in authors
+            ]
+            if len(follows) >= self.batch_size:
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+                follows = []
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+
+    def create_comments(self, users, posts, count):
+        if not posts:
+            return
+        texts = [self.fake.sentence() for _ in range(200)]
+        for size in batches(count, self.batch_size):
+            Comment.objects.bulk_create(
+                Comment(
+                    text=self.random.choice(texts),
+                    author_id=self.random.choice(users),
+                    post_id=self.random.choice(posts),
+                )
+                for _ in range(size)
+            )
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    db = schema_editor.connection.alias
+
+    def group_counts(queryset, field):
+        return dict(
+            queryset.order_by().values(field).annotate(total=Count('id'))
+            .values_list(field, 'total')
+        )
+
+    posts = group_counts(Post.objects.using(db), 'author_id')
+    followers = group_counts(Follow.objects.using(db), 'author_id')
+    following = group_counts(Follow.objects.using(db), 'user_id')
+    UserStats.objects.using(db).bulk_create(
+        (
+            UserStats(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            for user_id in User.objects.using(db).values_list('id', flat=True)
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0008_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'счётчики пользователя',
+                'verbose_name_plural': 'счётчики пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:30
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    db = schema_editor.connection.alias
+    duplicates = (
+        Follow.objects.using(db).values('user_id', 'author_id')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        Follow.objects.using(db).filter(
+            user_id=row['user_id'], author_id=row['author_id'],
+        ).exclude(id=row['first_id']).delete()
+        UserStats.objects.using(db).filter(user_id=row['author_id']).update(
+            followers_count=Follow.objects.using(db).filter(
+                author_id=row['author_id']).count())
+        UserStats.objects.using(db).filter(user_id=row['user_id']).update(
+            following_count=Follow.objects.using(db).filter(
+                user_id=row['user_id']).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_userstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date', 'id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date', 'id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_user_author_unique'),
+        ),
+    ]
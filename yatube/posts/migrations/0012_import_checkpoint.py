@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True, verbose_name='Файл')),
+                ('position', models.PositiveIntegerField(verbose_name='Строк загружено')),
+            ],
+            options={
+                'verbose_name': 'контрольная точка загрузки',
+                'verbose_name_plural': 'контрольные точки загрузки',
+            },
+        ),
+    ]
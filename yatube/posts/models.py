@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.objectcache import ObjectCache
+
 User = get_user_model()
 
 
@@ -9,6 +11,8 @@ class Group(models.Model):
     slug = models.SlugField(unique=True)
     description = models.TextField()
 
+    cached = ObjectCache('pk', 'slug')
+
     def __str__(self):
         return f'{self.title}'
 
@@ -43,11 +47,27 @@ class Post(models.Model):
         blank=True
     )
 
+    cached = ObjectCache('pk', related=('author', 'group'))
+
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='post_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -78,6 +98,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
 
@@ -98,8 +124,141 @@ class Follow(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='follow_user_author_unique',
+            ),
+        ]
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
 
     def __str__(self):
         return f'класс follow: {self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out-on-write), поэтому лента
+    /follow/ читается одним проходом по индексу (user, pub_date, post).
+    Поля author и pub_date скопированы из поста.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_user_post_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+
+    def __str__(self):
+        return f'лента {self.user_id}: пост {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Счётчики постов и подписок пользователя.
+
+    Обновляются сигналами при создании и удалении постов и подписок,
+    чтобы страницы профиля и поста не считали COUNT(*) на каждый запрос.
+    Расхождения исправляет команда recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'счётчики пользователя'
+        verbose_name_plural = 'счётчики пользователей'
+
+    def __str__(self):
+        return f'счётчики {self.user_id}'
+
+
+class ImportCheckpoint(models.Model):
+    """Сколько строк файла уже загрузила команда import_posts.
+
+    Пишется в той же транзакции, что и посты очередной части файла,
+    поэтому после сбоя --resume не загрузит эту часть повторно.
+    """
+    path = models.CharField('Файл', max_length=500, unique=True)
+    position = models.PositiveIntegerField('Строк загружено')
+
+    class Meta:
+        verbose_name = 'контрольная точка загрузки'
+        verbose_name_plural = 'контрольные точки загрузки'
+
+    def __str__(self):
+        return f'{self.path}: {self.position}'
+
+
+class SearchField(models.TextField):
+    """Колонка таблицы FTS5, по которой работает поиск text__match."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchEntry(models.Model):
+    """Полнотекстовый индекс текстов постов (SQLite FTS5).
+
+    Таблицу создаёт миграция 0011, а поддерживают в актуальном
+    состоянии триггеры на posts_post, поэтому индекс не отстаёт и при
+    bulk_create и update(). rank - встроенная оценка bm25, чем меньше,
+    тем выше пост в выдаче.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='+',
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
@@ -0,0 +1,197 @@
+import datetime
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(pub_date, pk):
+    """Кодирует ключ (pub_date, id) в строку для ссылки."""
+    delta = pub_date - EPOCH
+    microseconds = (
+        (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    )
+    return f'{microseconds}.{pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        microseconds, pk = cursor.split('.')
+        pub_date = EPOCH + datetime.timedelta(microseconds=int(microseconds))
+        return pub_date, int(pk)
+    except (ValueError, OverflowError):
+        raise InvalidCursor(cursor)
+
+
+def key_range(queryset, keys, values, lookup):
+    """Строки queryset дальше ключа values по ключам keys (lookup - lt или
+    gt)."""
+    # Условие pub_date <= X вынесено отдельно, чтобы SQLite выбрал
+    # диапазонный поиск по индексу (pub_date, id).
+    date_key, id_key = keys
+    pub_date, pk = values
+    return queryset.filter(
+        Q(**{f'{date_key}__{lookup}e': pub_date}),
+        Q(**{f'{date_key}__{lookup}': pub_date})
+        | Q(**{f'{id_key}__{lookup}': pk}),
+    )
+
+
+class CursorPage(Page):
+    """Страница, выбранная по курсору: без COUNT(*) и без OFFSET.
+
+    Номер такой страницы неизвестен, поэтому вместо номеров соседних
+    страниц она отдаёт курсоры next_cursor и previous_cursor.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page by cursor>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор ленты постов по ключу (pub_date, id).
+
+    Первые max_page_number страниц доступны по номеру (?page=N), как и
+    раньше; больший номер даёт страницу max_page_number. Дальше ссылки
+    строятся по курсору (?after=... и ?before=...), и страница выбирается
+    диапазонным поиском по индексу.
+    """
+    keys = ('pub_date', 'id')
+    descending = True
+    max_page_number = 5
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        sign = '-' if self.descending else ''
+        ordering = [f'{sign}{key}' for key in self.keys]
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        self.count_known = count is not None
+        if count is not None:
+            # Число объектов уже известно (например, из счётчиков
+            # UserStats), поэтому COUNT(*) не нужен.
+            self.count = count
+
+    def prepare(self, rows):
+        """Превращает строки выборки в объекты страницы."""
+        return rows
+
+    def encode(self, *values):
+        return encode_cursor(*values)
+
+    def decode(self, cursor):
+        return decode_cursor(cursor)
+
+    def cursor(self, row):
+        return self.encode(*(getattr(row, key) for key in self.keys))
+
+    def get_page(self, number, after=None, before=None):
+        try:
+            if after:
+                return self.page_after(after)
+            if before:
+                return self.page_before(before)
+        except InvalidCursor:
+            pass
+        return self.page(number)
+
+    def _number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return 1
+        return min(max(number, 1), self.max_page_number)
+
+    def rows(self, bottom, limit):
+        """limit строк, начиная с bottom-й."""
+        return list(self.object_list[bottom:bottom + limit])
+
+    def rows_after(self, cursor, limit):
+        """limit строк после курсора, в порядке ленты."""
+        forward, _ = self._lookups()
+        return list(self._range(cursor, forward)[:limit])
+
+    def rows_before(self, cursor, limit):
+        """limit строк перед курсором, от ближайшей к нему."""
+        _, backward = self._lookups()
+        return list(self._range(cursor, backward).reverse()[:limit])
+
+    def page(self, number):
+        number = self._number(number)
+        bottom = (number - 1) * self.per_page
+        rows = self.rows(bottom, self.per_page + 1)
+        if not rows and number > 1:
+            # Лента короче запрошенной страницы.
+            return self.page(1)
+        has_more = len(rows) > self.per_page
+        if not self.count_known:
+            # Нижняя граница числа объектов: её хватает, чтобы Page знала,
+            # есть ли следующая страница, без COUNT(*).
+            self.count = bottom + len(rows)
+            self.__dict__.pop('num_pages', None)
+        rows = rows[:self.per_page]
+        page = Page(self.prepare(rows), number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if number >= self.max_page_number and has_more:
+            page.next_cursor = self.cursor(rows[-1])
+        return page
+
+    def _range(self, cursor, lookup):
+        return key_range(
+            self.object_list, self.keys, self.decode(cursor), lookup)
+
+    def _lookups(self):
+        # Пары условий для следующей и предыдущей страниц.
+        return ('lt', 'gt') if self.descending else ('gt', 'lt')
+
+    def page_after(self, cursor):
+        rows = self.rows_after(cursor, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            self.prepare(rows),
+            self,
+            next_cursor=self.cursor(rows[-1]) if has_more else None,
+            previous_cursor=self.cursor(rows[0]) if rows else None,
+        )
+
+    def page_before(self, cursor):
+        rows = self.rows_before(cursor, self.per_page + 1)
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: отдаём полную первую страницу.
+            return self.get_page(1)
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            self.prepare(rows),
+            self,
+            next_cursor=self.cursor(rows[-1]),
+            previous_cursor=self.cursor(rows[0]),
+        )
+
+
+def paginate(request, object_list, per_page,
+             paginator_class=KeysetPaginator, count=None):
+    """Возвращает страницу ленты по параметрам page, after и before."""
+    paginator = paginator_class(object_list, per_page, count=count)
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
@@ -0,0 +1,105 @@
+"""Планы выполнения запросов лент (EXPLAIN QUERY PLAN).
+
+Запросы собираются функциями представлений, ленты подписок и поиска,
+поэтому отчёт команды explain_feeds показывает реальные планы.
+"""
+import datetime
+
+from django.utils import timezone
+
+from . import follows, fulltext, timeline, views
+from .models import Group, Post, User
+from .paginator import KeysetPaginator
+from .timeline import MergedTimelinePaginator, TimelinePaginator
+
+PER_PAGE = 10
+SAMPLE_DATE = datetime.datetime(2022, 8, 1, tzinfo=timezone.utc)
+SAMPLE_QUERY = 'пост'
+# Выдача поиска идёт по bm25, которая считается для каждого запроса
+# заново: найденные строки сортируются всегда, индекс тут не поможет.
+RANKED = ('search',)
+
+
+def _pages(name, queryset, paginator_class=KeysetPaginator,
+           sample=(SAMPLE_DATE, 1)):
+    paginator = paginator_class(queryset, PER_PAGE)
+    cursor = paginator.encode(*sample)
+    forward, backward = paginator._lookups()
+    yield name, paginator.object_list[:PER_PAGE + 1]
+    yield (
+        f'{name} (after)',
+        paginator._range(cursor, forward)[:PER_PAGE + 1],
+    )
+    yield (
+        f'{name} (before)',
+        paginator._range(cursor, backward).reverse()[:PER_PAGE + 1],
+    )
+
+
+def _merged_pages(name, sources):
+    paginator = MergedTimelinePaginator(sources, PER_PAGE)
+    cursor = paginator.encode(SAMPLE_DATE, 1)
+    pages = (
+        (name, paginator.heads(PER_PAGE + 1)),
+        (f'{name} (after)', paginator.ranges(cursor, 'lt', PER_PAGE + 1)),
+        (f'{name} (before)', paginator.ranges(cursor, 'gt', PER_PAGE + 1)),
+    )
+    for page_name, querysets in pages:
+        # Записи ленты те же, что и в follow_index; здесь - посты автора.
+        yield page_name, querysets[-1]
+
+
+def feed_queries(user_id=1, author_id=2, group_id=1, post_id=1):
+    """Пары (название, queryset) для всех запросов лент."""
+    author = User(pk=author_id)
+    yield from _pages('index', views.index_list())
+    yield from _pages('group_posts', views.group_list(Group(pk=group_id)))
+    yield from _pages('profile', views.profile_list(author))
+    yield from _pages('follow_index', timeline.entries(user_id),
+                      TimelinePaginator)
+    yield from _merged_pages(
+        'follow_index heavy author', timeline.sources(user_id, [author_id]))
+    yield from _pages('search', fulltext.entries(SAMPLE_QUERY),
+                      fulltext.SearchPaginator, sample=(-1.0, 1))
+    yield 'post_detail comments', views.comment_list(Post(pk=post_id))
+    yield 'following ids', follows.following_rows(user_id)
+    yield 'timeline heavy authors', timeline.heavy_among([author_id])
+    yield 'timeline remove', timeline.author_entries(user_id, author_id)
+
+
+def rank_sorts(name, plan):
+    """Сортировки выдачи по релевантности: они ожидаемы."""
+    if not name.startswith(RANKED):
+        return []
+    return [
+        line for line in plan.splitlines()
+        if 'TEMP B-TREE FOR ORDER BY' in line
+    ]
+
+
+def problems(plan, name=''):
+    """Строки плана с полным просмотром таблицы или сортировкой, кроме
+    сортировки выдачи по релевантности."""
+    expected = rank_sorts(name, plan)
+    return [
+        line for line in plan.splitlines()
+        if line not in expected and (
+            'TEMP B-TREE' in line
+            or ('SCAN' in line and 'INDEX' not in line)
+        )
+    ]
+
+
+def report():
+    """Отчёт в markdown: план каждого запроса и найденные проблемы."""
+    lines = ['# EXPLAIN QUERY PLAN для запросов лент', '']
+    for name, queryset in feed_queries():
+        plan = queryset.explain()
+        lines += [f'## {name}', '', '```sql', str(queryset.query), '```', '']
+        lines += ['```', plan, '```', '']
+        for line in rank_sorts(name, plan):
+            lines.append(f'**Сортировка по релевантности:** `{line.strip()}`')
+        for line in problems(plan, name):
+            lines.append(f'**Без индекса:** `{line.strip()}`')
+        lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, follows, timeline
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+def post_scopes(post):
+    scopes = [
+        caching.ALL_POSTS,
+        caching.author_scope(post.author.username),
+        caching.post_scope(post.pk),
+    ]
+    for slug in {getattr(post.group, 'slug', None),
+                 getattr(post, '_old_group_slug', None)}:
+        if slug:
+            scopes.append(caching.group_scope(slug))
+    return scopes
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        caching.bump(caching.SITE, caching.author_scope(instance.username))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    if instance.pk:
+        # Пост могли перенести в другую группу: старую тоже сбрасываем.
+        instance._old_group_slug = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group__slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    caching.bump(*post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, create=False, posts_count=-1)
+    caching.bump(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump(caching.SITE, caching.group_scope(instance.slug))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    caching.bump(caching.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        follows.followed(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.unfollowed(instance.user, instance.author)
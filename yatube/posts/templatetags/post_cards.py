@@ -0,0 +1,64 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.instrumentation import record_cache
+
+from .. import thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_version(post):
+    """Версия карточки: хэш всех данных, которые в ней выводятся.
+
+    Изменение поста, имени автора или слага группы даёт новый ключ,
+    поэтому сбрасывать карточки при изменениях не нужно.
+    """
+    parts = (
+        post.text,
+        post.image.name or '',
+        post.pub_date.isoformat(),
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    )
+    return hashlib.md5('\x00'.join(parts).encode()).hexdigest()
+
+
+def card_key(post, is_group_page):
+    variant = 'group' if is_group_page else 'feed'
+    return f'post_card:{post.pk}:{card_version(post)}:{variant}'
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Список HTML карточек постов; готовые берутся из кэша одним get_many.
+
+    Использование: {% post_cards page_obj as cards %}.
+    """
+    is_group_page = bool(context.get('is_group_page'))
+    keys = [card_key(post, is_group_page) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    record_cache(hits=len(cards), misses=len(missing))
+    found_thumbnails = thumbnails.resolve(post for _, post in missing)
+    rendered = {
+        key: render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'is_group_page': is_group_page,
+            'thumbnail': found_thumbnails.get(post.pk),
+        })
+        for key, post in missing
+    }
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
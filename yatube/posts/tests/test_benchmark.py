@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase
+
+from .. import benchmark
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from ..urls import urlpatterns
+
+User = get_user_model()
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed_benchmark', users=30, groups=3, posts=600,
+                     follows=5, comments=100, stdout=StringIO())
+
+    def test_seed(self):
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 600)
+        self.assertEqual(Follow.objects.count(), 30 * 5)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(TimelineEntry.objects.exists())
+        counts = list(
+            UserStats.objects.order_by('user_id')
+            .values_list('posts_count', flat=True)
+        )
+        self.assertEqual(sum(counts), 600)
+        # Первые по популярности авторы пишут заметно больше последних.
+        self.assertGreater(counts[0], 3 * counts[-1])
+
+    def test_seed_refuses_existing_prefix(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', posts=1, stdout=StringIO())
+
+    def test_run_covers_all_urls(self):
+        results = benchmark.run(repeat=2)
+        self.assertEqual(set(results),
+                         {pattern.name for pattern in urlpatterns})
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertNotIn('skipped', result)
+                self.assertLess(result['status'], 400)
+                self.assertLessEqual(result['median_ms'], result['p95_ms'])
+
+
+class WriteBenchmarkTests(SimpleTestCase):
+    def test_benchmark_writes(self):
+        """Замер идёт во временных БД и сравнивает оба режима."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'writes.json')
+            call_command('benchmark_writes', threads=2, seconds=0.3,
+                         users=5, output=output, stdout=StringIO())
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+        self.assertEqual(set(report['modes']), {'default', 'tuned'})
+        for mode, result in report['modes'].items():
+            with self.subTest(mode=mode):
+                self.assertGreater(result['ops'], 0)
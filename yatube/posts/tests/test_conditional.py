@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        )
+
+    def test_not_modified_without_rendering(self):
+        """На совпавший ETag отдаётся 304 без рендеринга шаблонов."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+
+    def test_etag_depends_on_user(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                guest = self.guest_client.get(url)
+                author = self.author_client.get(url)
+                self.assertNotEqual(guest['ETag'], author['ETag'])
+                self.assertIn('Cookie', author['Vary'])
+
+    def test_etag_changes_after_new_login(self):
+        """Повторный вход меняет секрет CSRF, и страница с формой
+        комментария не отдаётся ответом 304."""
+        User.objects.create_user(username='reader', password='password')
+        client = Client()
+        credentials = {'username': 'reader', 'password': 'password'}
+        client.post(reverse('users:login'), credentials)
+        detail = reverse('posts:post_detail', args=(self.post.id,))
+        etag = client.get(detail)['ETag']
+        self.assertEqual(
+            client.get(detail, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.get(reverse('users:logout'))
+        client.post(reverse('users:login'), credentials)
+        response = client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_data(self):
+        detail = reverse('posts:post_detail', args=(self.post.id,))
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(text='Комментарий', author=self.author,
+                               post=self.post)
+        response = self.guest_client.get(
+            detail, HTTP_IF_NONE_MATCH=etags[detail])
+        self.assertEqual(response.status_code, 200)
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Пост 2', author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            posts_count=42, followers_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('recount', stdout=StringIO())
+        stats = self.stats(self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertTrue(UserStats.objects.filter(user=self.user).exists())
+
+    def test_pages_read_stored_counter(self):
+        """Профиль и пост не считают посты автора через COUNT(*)."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=5)
+        client = Client()
+        urls = (
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(post.id,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(response.context['posts_count'], 5)
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] and 'posts_post' in query['sql']
+                    for query in queries.captured_queries
+                ))
@@ -0,0 +1,85 @@
+import csv
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.old = Post.objects.create(text='Старый', author=cls.author)
+        Post.objects.filter(pk=cls.old.pk).update(pub_date=datetime.datetime(
+            2020, 1, 1, tzinfo=timezone.utc))
+        cls.post = Post.objects.create(text='Новый, "в группе"',
+                                       author=cls.author, group=cls.group)
+        Post.objects.create(text='Чужой', author=cls.reader)
+        Comment.objects.create(text='Комментарий', author=cls.reader,
+                               post=cls.post)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args, **options):
+        out = StringIO()
+        call_command('export_content', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def test_posts_jsonl(self):
+        rows = [json.loads(line) for line in
+                self.export('posts', author='author').splitlines()]
+        self.assertEqual([row['text'] for row in rows],
+                         ['Старый', 'Новый, "в группе"'])
+        self.assertEqual(rows[1]['group'], 'group')
+        self.assertEqual(rows[0]['pub_date'], '2020-01-01T00:00:00Z')
+
+    def test_filters(self):
+        self.assertEqual(
+            len(self.export('posts', group='group').splitlines()), 1)
+        self.assertEqual(
+            len(self.export('posts', until='2020-01-01').splitlines()), 1)
+        self.assertEqual(
+            len(self.export('posts', since='2020-01-02').splitlines()), 2)
+        self.assertEqual(
+            len(self.export('comments', group='group').splitlines()), 1)
+        with self.assertRaises(CommandError):
+            self.export('follows', group='group')
+        with self.assertRaises(CommandError):
+            self.export('posts', since='вчера')
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(
+            self.export('follows', format='csv'))))
+        self.assertEqual(rows, [['user', 'author'], ['reader', 'author']])
+
+    def test_view_is_staff_only(self):
+        url = reverse('posts:export', args=('posts',))
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(self.staff)
+        response = client.get(url, {'format': 'csv', 'group': 'group'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="posts.csv"')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([row['text'] for row in rows],
+                         ['Новый, "в группе"'])
+        response = client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        response = client.get(reverse('posts:export', args=('users',)))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from core import routers
+
+from .. import follows
+from ..models import Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class FollowsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост автора', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_and_unfollow_are_idempotent(self):
+        """Повторная подписка и отписка ничего не меняют."""
+        self.assertTrue(follows.follow(self.reader, self.author))
+        self.assertFalse(follows.follow(self.reader, self.author))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertTrue(follows.unfollow(self.reader, self.author))
+        self.assertFalse(follows.unfollow(self.reader, self.author))
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_following_ids_are_cached(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(follows.following_ids(self.reader.pk),
+                         {self.author.pk})
+        self.assertEqual(follows.following_ids(self.author.pk), frozenset())
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(self.reader, self.author.pk))
+            self.assertFalse(follows.is_following(self.author, self.reader.pk))
+            self.assertFalse(
+                follows.is_following(AnonymousUser(), self.author.pk))
+
+    def test_set_is_loaded_from_primary(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        # Алиаса нет в DATABASES: чтение с него выбросило бы ошибку.
+        with routers.use_replica('lagging'):
+            self.assertEqual(follows.following_ids(self.reader.pk),
+                             {self.author.pk})
+
+    def test_set_is_updated_on_follow_and_unfollow(self):
+        """Множество сбрасывается и при подписке через ORM, и через views."""
+        self.assertEqual(follows.following_ids(self.reader.pk), frozenset())
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(follows.following_ids(self.reader.pk),
+                         {self.author.pk})
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=[self.author.username]))
+        self.assertEqual(follows.following_ids(self.reader.pk), frozenset())
+        self.client.get(reverse('posts:profile_follow',
+                                args=[self.author.username]))
+        self.assertEqual(follows.following_ids(self.reader.pk),
+                         {self.author.pk})
+
+    def test_unfollow_without_follow(self):
+        response = self.client.get(reverse('posts:profile_unfollow',
+                                           args=[self.author.username]))
+        self.assertRedirects(
+            response, reverse('posts:profile', args=[self.reader.username]))
+
+    def test_profile_shows_following(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        self.assertFalse(self.client.get(url).context['following'])
+        follows.follow(self.reader, self.author)
+        self.assertTrue(self.client.get(url).context['following'])
+
+
+class FollowsCommitTests(TransactionTestCase):
+    def test_set_is_forgotten_after_commit(self):
+        reader = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        with transaction.atomic():
+            follows.follow(reader, author)
+            # Другой запрос кэширует множество, прочитанное до коммита.
+            cache.set(follows._key(reader.pk), frozenset())
+        self.assertEqual(follows.following_ids(reader.pk), {author.pk})
@@ -1,3 +1,4 @@
+import os
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -5,7 +6,10 @@ from http import HTTPStatus
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import OperationalError, connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
 from django.urls import reverse
 
 from ..models import Group, Post, Comment
@@ -123,3 +127,55 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(Comment.objects.count(), comments_count + 1)
         self.assertEqual(test_comment.text, form_data['text'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, DB_LOCKED_BACKOFF=0)
+class PostCreateRetryTests(TransactionTestCase):
+    # Повтор при "database is locked" виден только вне транзакции теста.
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_locked_insert_is_retried_without_new_upload(self):
+        attempts = []
+
+        def locked_once(execute, sql, params, many, context):
+            if sql.startswith('INSERT INTO "posts_post"'):
+                attempts.append(sql)
+                if len(attempts) == 1:
+                    raise OperationalError('database is locked')
+            return execute(sql, params, many, context)
+
+        uploaded = SimpleUploadedFile(
+            name='retry.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            ),
+            content_type='image/gif',
+        )
+        with connection.execute_wrapper(locked_once):
+            response = self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Повтор', 'image': uploaded},
+            )
+        self.assertRedirects(
+            response, reverse('posts:profile', args=[self.user.username]))
+        self.assertEqual(len(attempts), 2)
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/retry.gif')
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')),
+            ['retry.gif'],
+        )
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import images
+from ..models import Post
+from .test_thumbnails import image_file
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   POST_IMAGE_WORKERS=0)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create(self, image):
+        return self.client.post(reverse('posts:post_create'),
+                                {'text': 'Текст', 'image': image})
+
+    @override_settings(POST_IMAGE_MAX_SIDE=400)
+    def test_large_image_is_downscaled(self):
+        self.create(image_file('wide.png', size=(1200, 300)))
+        post = Post.objects.get(text='Текст')
+        self.assertEqual(post.image.name, 'posts/wide.png')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (400, 100))
+            self.assertEqual(image.format, 'PNG')
+
+    def test_small_image_is_kept(self):
+        upload = image_file('small.png', size=(100, 50))
+        content = upload.read()
+        upload.seek(0)
+        self.create(upload)
+        post = Post.objects.get(text='Текст')
+        with open(post.image.path, 'rb') as saved:
+            self.assertEqual(saved.read(), content)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        response = self.create(image_file(size=(100, 50)))
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка слишком большая: 100×50.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(MAX_UPLOAD_SIZE=100)
+    def test_oversized_upload_rejected(self):
+        """Файл больше лимита отбрасывается при приёме и не сохраняется."""
+        response = self.create(image_file())
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 100\xa0байт.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_WORKERS=1, POST_IMAGE_MAX_SIDE=400)
+    def test_broken_pool_is_replaced(self):
+        """Смерть процесса пула не ломает следующие загрузки."""
+        broken = images.get_executor()
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        self.create(image_file('pool.png', size=(1200, 300)))
+        post = Post.objects.get(text='Текст')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (400, 100))
+        executor = images.get_executor()
+        self.assertIsNot(executor, broken)
+        images._replace_executor(executor)
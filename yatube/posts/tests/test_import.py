@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import counters, timeline
+from ..models import (
+    Follow, Group, ImportCheckpoint, Post, SearchEntry, TimelineEntry,
+    UserStats,
+)
+
+User = get_user_model()
+
+
+class ImportPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, stdout=out, stderr=err,
+                     **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_jsonl(self):
+        rows = [
+            {'text': 'Первый', 'author': 'author', 'group': 'group',
+             'pub_date': '2020-01-02T03:04:05+00:00'},
+            {'text': 'Второй', 'author': 'author'},
+            {'text': 'Чужой', 'author': 'nobody'},
+        ]
+        path = self.write('posts.jsonl', '\n'.join(
+            json.dumps(row, ensure_ascii=False) for row in rows
+        ) + '\n{broken\n')
+        with mock.patch.object(timeline, 'rebuild') as rebuild, \
+                mock.patch.object(counters, 'recount') as recount:
+            out, err = self.run_import(path, batch_size=1)
+        # Ленты и счётчики обновляются только по загруженным постам.
+        rebuild.assert_not_called()
+        recount.assert_not_called()
+        self.assertIn('Загружено постов: 2, пропущено строк: 2', out)
+        self.assertIn('строк/с', out)
+        self.assertIn("Строка 3: нет автора 'nobody'", err)
+        self.assertIn('Строка 4: неверный JSON', err)
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.group, self.group)
+        self.assertEqual(first.pub_date, datetime.datetime(
+            2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertTrue(
+            SearchEntry.objects.filter(text__match='первый').exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_import_csv(self):
+        path = self.write(
+            'posts.csv',
+            'text,author,group\nИз CSV,author,\n"Две, строки",author,group\n'
+        )
+        out, _ = self.run_import(path)
+        self.assertIn('Загружено постов: 2', out)
+        self.assertTrue(Post.objects.filter(text='Две, строки',
+                                            group=self.group).exists())
+
+    def test_resume_after_failure(self):
+        path = self.write('posts.jsonl', ''.join(
+            json.dumps({'text': f'Пост {number}', 'author': 'author'}) + '\n'
+            for number in range(5)
+        ))
+        bulk_create = QuerySet.bulk_create
+        calls = []
+
+        def failing(queryset, objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 2:
+                raise RuntimeError('сбой')
+            return bulk_create(queryset, objs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', failing):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, transaction_size=2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            ImportCheckpoint.objects.get(path=os.path.abspath(path)).position,
+            2)
+        out, _ = self.run_import(path, transaction_size=2, resume=True)
+        self.assertIn('Загружено постов: 3', out)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {number}' for number in range(5)],
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5)
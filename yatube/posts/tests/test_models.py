@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -36,3 +37,13 @@ class PostModelTest(TestCase):
             expected_object_name_group,
             '__str__ в модели "Group" работает неверно'
         )
+
+
+class FollowModelTest(TestCase):
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена на уровне БД."""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
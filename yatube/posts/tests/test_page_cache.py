@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import tiered
+
+from .. import caching
+from ..models import Post
+
+User = get_user_model()
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Старый текст', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.url = reverse('posts:index')
+
+    def current_key(self):
+        request = RequestFactory().get(self.url)
+        request.user = AnonymousUser()
+        generations = caching.get_generations(
+            *caching.index_scopes(request))
+        return caching.page_keys(request, generations)[0]
+
+    def change_post(self, text):
+        # update() не отправляет сигналов, поколение меняем сами.
+        Post.objects.filter(pk=self.post.pk).update(text=text)
+        caching.bump(caching.ALL_POSTS)
+
+    def test_stale_page_while_rebuilding(self):
+        """Пока страницу собирает другой запрос, отдаётся прежняя."""
+        etag = self.client.get(self.url)['ETag']
+        self.change_post('Новый текст')
+        self.assertTrue(caching._lock(self.current_key()))
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Старый текст')
+        self.assertEqual(response['ETag'], etag)
+        caching._unlock(self.current_key())
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Новый текст')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_l1_hit_is_not_unpickled(self):
+        """Страница хранится неизменяемым кортежем, без pickle."""
+        self.client.get(self.url)
+        with mock.patch.object(tiered.pickle, 'loads',
+                               side_effect=AssertionError):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Старый текст')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+    @override_settings(PAGE_REBUILD_WAIT=0)
+    def test_renders_without_stale_copy(self):
+        self.assertTrue(caching._lock(self.current_key()))
+        self.assertContains(self.client.get(self.url), 'Старый текст')
+
+    def test_expires_early_probability(self):
+        """Раннее истечение вероятнее для долгих сборок и к концу срока."""
+        now = caching.time.time()
+        with mock.patch.object(caching.random, 'random', return_value=0):
+            self.assertFalse(caching._expires_early(now, 10, 100))
+            self.assertTrue(caching._expires_early(now - 100, 0.1, 100))
+        # -ln(1 - 0.99) ≈ 4.6
+        with mock.patch.object(caching.random, 'random', return_value=0.99):
+            self.assertFalse(caching._expires_early(now, 1, 100))
+            self.assertTrue(caching._expires_early(now, 30, 100))
+            self.assertFalse(caching._expires_early(now, 30, None))
+
+    def test_early_expiration_rebuilds_page(self):
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        self.assertContains(self.client.get(self.url), 'Старый текст')
+        with mock.patch.object(caching, '_expires_early', return_value=True):
+            self.assertContains(self.client.get(self.url), 'Новый текст')
+        self.assertContains(self.client.get(self.url), 'Новый текст')
+
+    def test_failed_rebuild_releases_lock(self):
+        url = reverse('posts:profile', args=('nobody',))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        generations = caching.get_generations(
+            *caching.profile_scopes(request, 'nobody'))
+        key = caching.page_keys(request, generations)[0]
+        self.assertTrue(caching._lock(key))
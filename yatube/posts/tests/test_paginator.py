@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters
+from ..models import Post
+from ..paginator import CursorPage, KeysetPaginator, encode_cursor
+
+User = get_user_model()
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.COUNT_POST_FOR_TEST = 27
+        # Посты создаются быстрее, чем меняется pub_date, поэтому порядок
+        # среди одинаковых дат определяется только по id.
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.user)
+            for number in range(cls.COUNT_POST_FOR_TEST)
+        )
+        # bulk_create не отправляет сигналы, счётчики пересчитываем сами.
+        counters.recount()
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def walk_forward(self, paginator):
+        page = paginator.get_page(1)
+        seen = [post.id for post in page]
+        while page.has_next():
+            if getattr(page, 'next_cursor', None):
+                page = paginator.get_page(None, after=page.next_cursor)
+            else:
+                page = paginator.get_page(page.next_page_number())
+            seen.extend(post.id for post in page)
+        return seen
+
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        """Переход по курсорам проходит ленту целиком и без повторов."""
+        for max_page_number in (1, 2, 5):
+            with self.subTest(max_page_number=max_page_number):
+                paginator = KeysetPaginator(Post.objects.all(), 4)
+                paginator.max_page_number = max_page_number
+                self.assertEqual(self.walk_forward(paginator), self.expected)
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору не выполняет COUNT(*)."""
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        cursor = paginator.get_page(5).next_cursor
+        self.assertIsNotNone(cursor)
+        with self.assertNumQueries(1):
+            page = KeysetPaginator(Post.objects.all(), 5).get_page(
+                None, after=cursor)
+            self.assertIsInstance(page, CursorPage)
+            self.assertEqual(
+                [post.id for post in page], self.expected[25:27])
+        self.assertFalse(page.has_next())
+
+    def test_before_cursor_returns_previous_page(self):
+        paginator = KeysetPaginator(Post.objects.all(), 5)
+        cursor = paginator.get_page(5).next_cursor
+        page = paginator.get_page(None, after=cursor)
+        previous = paginator.get_page(None, before=page.previous_cursor)
+        self.assertEqual([post.id for post in previous], self.expected[20:25])
+        post = Post.objects.get(pk=self.expected[3])
+        near_top = encode_cursor(post.pub_date, post.pk)
+        first = paginator.get_page(None, before=near_top)
+        self.assertEqual(first.number, 1)
+        self.assertEqual([post.id for post in first], self.expected[:5])
+
+    def test_numbered_pages_are_capped_and_do_not_count(self):
+        """?page=N дальше max_page_number даёт последнюю нумерованную
+        страницу, и ни одна страница по номеру не выполняет COUNT(*)."""
+        paginator = KeysetPaginator(Post.objects.all(), 2)
+        with self.assertNumQueries(1) as queries:
+            page = paginator.get_page(100)
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+        self.assertEqual(page.number, paginator.max_page_number)
+        self.assertEqual([post.id for post in page], self.expected[8:10])
+        self.assertIsNotNone(page.next_cursor)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Последняя')
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.guest_client.get(
+            reverse('posts:index') + '?after=broken')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertEqual(len(page_obj), 10)
+
+    @mock.patch.object(KeysetPaginator, 'max_page_number', 2)
+    def test_deep_page_links_use_cursor(self):
+        """Начиная с max_page_number ссылка «Следующая» идёт по курсору."""
+        url = reverse('posts:profile', args=(self.user.username,))
+        response = self.guest_client.get(url)
+        self.assertContains(response, '?page=2')
+        response = self.guest_client.get(url + '?page=2')
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?after={next_cursor}')
+        response = self.guest_client.get(url + f'?after={next_cursor}')
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.expected[20:],
+        )
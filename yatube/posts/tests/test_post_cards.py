@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+CARDS = Template(
+    '{% load post_cards %}{% post_cards posts as cards %}'
+    '{% for card in cards %}{{ card }}{% endfor %}'
+)
+
+
+class PostCardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(3):
+            Post.objects.create(text=f'Пост {number}', author=cls.user,
+                                group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, **context):
+        posts = list(Post.objects.select_related('author', 'group'))
+        return CARDS.render(Context({'posts': posts, **context}))
+
+    def test_warm_render_uses_cache(self):
+        """Повторный вывод карточек не рендерит шаблон карточки."""
+        cold = self.render()
+        with self.assertTemplateNotUsed('posts/includes/post_card.html'):
+            warm = self.render()
+        self.assertEqual(cold, warm)
+        self.assertEqual(warm.count('<article>'), 3)
+
+    def test_card_changes_with_content(self):
+        self.render()
+        Post.objects.filter(text='Пост 0').update(text='Новый текст')
+        self.assertIn('Новый текст', self.render())
+        User.objects.filter(pk=self.user.pk).update(first_name='Лев')
+        self.assertIn('Лев', self.render())
+
+    def test_group_page_variant(self):
+        """На странице группы ссылка на группу в карточке не выводится."""
+        self.assertIn('/group/group/', self.render())
+        self.assertNotIn('/group/group/', self.render(is_group_page=True))
@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.functional import SimpleLazyObject
+from django.urls import reverse
+
+from core.decorators import QueryBudgetExceeded, query_budget, uncounted
+
+from .. import views
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class FeedQueriesTests(TestCase):
+    """Число запросов страниц не зависит от числа постов и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.author = User.objects.create_user(username='author0')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count):
+        for number in range(count):
+            author = User.objects.create_user(
+                username=f'author{Post.objects.count() + 1}')
+            Follow.objects.create(user=self.reader, author=author)
+            post = Post.objects.create(text='Пост', author=author,
+                                       group=self.group)
+            Comment.objects.create(text='Комментарий', author=author,
+                                   post=post)
+        return post
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        post = self.add_posts(1)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=(post.author.username,)),
+            reverse('posts:post_detail', args=(post.id,)),
+        )
+        before = {url: self.count_queries(url) for url in urls}
+        self.add_posts(9)
+        Comment.objects.bulk_create(
+            Comment(text='Ещё', author=self.reader, post=post)
+            for _ in range(5)
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), before[url])
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+
+    @staticmethod
+    def view(request):
+        list(User.objects.all())
+        list(User.objects.all())
+
+    def test_views_have_own_budgets(self):
+        """Бюджет стоит на своём представлении, а не на соседнем."""
+        self.assertEqual(views.search.query_budget, 6)
+        self.assertEqual(views.post_create.query_budget, 10)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_raises(self):
+        query_budget(2)(self.view)(self.request)
+        with self.assertRaises(QueryBudgetExceeded):
+            query_budget(1)(self.view)(self.request)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_logs_warning(self):
+        with self.assertLogs('core.decorators', 'WARNING'):
+            query_budget(1)(self.view)(self.request)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_user_and_uncounted_queries_are_not_counted(self):
+        """Загрузка пользователя запроса и блоки uncounted() не считаются."""
+        user = User.objects.create_user(username='budget')
+        self.request.user = SimpleLazyObject(
+            lambda: User.objects.get(pk=user.pk))
+
+        def view(request):
+            with uncounted():
+                list(User.objects.all())
+            return request.user.username
+
+        self.assertEqual(query_budget(0)(view)(self.request), 'budget')
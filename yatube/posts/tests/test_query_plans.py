@@ -0,0 +1,22 @@
+from django.test import TestCase
+
+from .. import query_plans
+
+
+class QueryPlansTests(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не просматривают таблицы целиком и не сортируют."""
+        names = []
+        for name, queryset in query_plans.feed_queries():
+            names.append(name)
+            with self.subTest(query=name):
+                self.assertEqual(
+                    query_plans.problems(queryset.explain(), name), [])
+        self.assertIn('search', names)
+        self.assertIn('follow_index heavy author (after)', names)
+
+    def test_only_search_is_sorted(self):
+        """Сортировка допустима только для выдачи по релевантности."""
+        plan = '1 0 0 USE TEMP B-TREE FOR ORDER BY'
+        self.assertEqual(query_plans.problems(plan, 'search (after)'), [])
+        self.assertEqual(query_plans.problems(plan, 'index'), [plan])
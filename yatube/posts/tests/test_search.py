@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import fulltext
+from ..models import Post, SearchEntry
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, query, **params):
+        return self.client.get(reverse('posts:search'),
+                               {'q': query, **params})
+
+    def test_fts_query_quotes_terms(self):
+        """Операторы FTS5 из ввода экранируются как обычные слова."""
+        self.assertEqual(fulltext.fts_query('Кот OR "пёс" -x'),
+                         '"кот"* "or"* "пёс"* "x"*')
+
+    def test_index_follows_post_changes(self):
+        post = Post.objects.create(text='Про котов', author=self.author)
+        found = SearchEntry.objects.filter(text__match='котов')
+        self.assertEqual(list(found.values_list('post_id', flat=True)),
+                         [post.pk])
+        post.text = 'Про собак'
+        post.save()
+        self.assertFalse(found.exists())
+        Post.objects.filter(pk=post.pk).update(text='Снова котов')
+        self.assertTrue(found.exists())
+        post.delete()
+        self.assertFalse(found.exists())
+
+    def test_results_are_ranked(self):
+        Post.objects.create(text='кот и пёс', author=self.author)
+        best = Post.objects.create(text='кот кот кот', author=self.author)
+        Post.objects.create(text='только пёс', author=self.author)
+        response = self.search('кот')
+        posts = list(response.context['page_obj'])
+        self.assertEqual(len(posts), 2)
+        self.assertEqual(posts[0], best)
+
+    def test_prefix_and_all_terms(self):
+        post = Post.objects.create(text='Новые посты о погоде',
+                                   author=self.author)
+        Post.objects.create(text='Посты о спорте', author=self.author)
+        response = self.search('пост погод')
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_cursor_pages(self):
+        for number in range(60):
+            Post.objects.create(text=f'слово {number}', author=self.author)
+        seen = []
+        response = self.search('слово')
+        while True:
+            page = response.context['page_obj']
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            if page.next_cursor:
+                response = self.search('слово', after=page.next_cursor)
+            else:
+                response = self.search('слово',
+                                       page=page.next_page_number())
+        self.assertEqual(len(seen), 60)
+        self.assertEqual(len(set(seen)), 60)
+        self.assertContains(response, 'q=%D1%81%D0%BB%D0%BE%D0%B2%D0%BE&')
+
+    def test_empty_query(self):
+        response = self.search('  !!! ')
+        self.assertIsNone(response.context['page_obj'])
+        response = self.search('нет такого')
+        self.assertContains(response, 'ничего не найдено')
+
+    def test_admin_uses_index(self):
+        post = Post.objects.create(text='Про котов', author=self.author)
+        Post.objects.create(text='Про собак', author=self.author)
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кот'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [post])
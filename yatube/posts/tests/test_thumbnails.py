@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from core.decorators import QueryCounter
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(name='image.png', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(200, 10, 10)).save(buffer, 'png')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        default.kvstore.clear_local()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_create_schedules_thumbnail(self):
+        """После создания поста миниатюра ставится в очередь."""
+        with mock.patch.object(thumbnails.transaction, 'on_commit',
+                               lambda func, using=None: func()), \
+                mock.patch.object(thumbnails, 'submit') as submit:
+            self.client.post(reverse('posts:post_create'),
+                             {'text': 'Текст', 'image': image_file()})
+        post = Post.objects.get(text='Текст')
+        submit.assert_called_once_with(post.image.name)
+
+    def test_submit_generates_thumbnail(self):
+        post = Post.objects.create(text='Текст', author=self.user,
+                                   image=image_file())
+        thumbnails.submit(post.image.name)
+        thumbnail = thumbnails.generate(post.image.name)
+        self.assertTrue(default_storage.exists(thumbnail.name))
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+
+    def test_pregenerate_command(self):
+        post = Post.objects.create(text='Текст', author=self.user,
+                                   image=image_file('other.png'))
+        out = StringIO()
+        call_command('pregenerate_thumbnails', workers=0, stdout=out)
+        self.assertIn('ошибок: 0', out.getvalue())
+        thumbnail = thumbnails.generate(post.image.name)
+        self.assertTrue(default_storage.exists(thumbnail.name))
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_cold_thumbnail_does_not_exceed_budget(self):
+        """Создание миниатюры в запросе не входит в бюджет страницы."""
+        Post.objects.create(text='Текст', author=self.user,
+                            image=image_file('cold.png'))
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:profile', args=(self.user.username,)))
+        self.assertEqual(response.status_code, 200)
+
+    def test_resolve_batches_lookups(self):
+        """Миниатюры страницы находятся одним запросом к хранилищу sorl."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                image=image_file(f'batch{i}.png'))
+            for i in range(3)
+        ]
+        posts.append(Post.objects.create(text='Без картинки',
+                                         author=self.user))
+        created = thumbnails.resolve(posts)
+        self.assertEqual(set(created), {post.pk for post in posts[:3]})
+        default.kvstore.clear_local()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            found = thumbnails.resolve(posts)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            {pk: thumbnail.url for pk, thumbnail in found.items()},
+            {pk: thumbnail.url for pk, thumbnail in created.items()},
+        )
+        default.kvstore.clear_local()
+        with self.assertNumQueries(0):
+            thumbnails.resolve(posts)
+
+    def test_lookups_count_towards_budget(self):
+        """В бюджет не входит только создание миниатюры: запросы поиска
+        готовых миниатюр видны query_budget."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.user,
+                                image=image_file(f'counted{i}.png'))
+            for i in range(2)
+        ]
+        thumbnails.resolve(posts)
+        for lookup in (
+            lambda: thumbnails.resolve(posts),
+            lambda: default.backend.get_thumbnail(
+                posts[0].image, thumbnails.GEOMETRY, **thumbnails.OPTIONS),
+        ):
+            default.kvstore.clear_local()
+            cache.clear()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                lookup()
+            self.assertEqual(counter.count, 1)
+
+    def test_card_uses_resolved_thumbnail(self):
+        post = Post.objects.create(text='Текст', author=self.user,
+                                   image=image_file('card.png'))
+        thumbnail = thumbnails.generate(post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .. import follows, timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка добавляет старые посты автора, отписка их убирает."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.feed(), ['Старый пост'])
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Новый пост', author=self.author)
+        Post.objects.create(text='Чужой пост', author=self.other)
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_is_read_on_demand(self):
+        """Посты авторов с большим числом подписчиков читаются при запросе."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_below_limit_again_is_fanned_out(self):
+        """Посты, опубликованные при большом числе подписчиков, попадают
+        в ленты, когда подписчиков снова становится не больше лимита."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        other_follow = Follow.objects.create(user=self.other,
+                                             author=self.author)
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__text='Новый пост').exists())
+        other_follow.delete()
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_heavy_authors_are_merged_page_by_page(self):
+        """Лента с тяжёлыми авторами листается по номерам и курсорам
+        без пропусков и повторов."""
+        heavy = User.objects.create_user(username='heavy')
+        Follow.objects.create(user=self.other, author=heavy)
+        Follow.objects.create(user=self.reader, author=heavy)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for number in range(40):
+            Post.objects.create(text=f'Пост {number}',
+                                author=(heavy, self.author)[number % 3 == 0])
+        # Запись ленты, оставшаяся от времени до «тяжести» автора.
+        duplicate = Post.objects.filter(author=heavy).first()
+        TimelineEntry.objects.create(
+            user=self.reader, post=duplicate, author=heavy,
+            pub_date=duplicate.pub_date)
+        expected = list(
+            Post.objects.filter(author__in=[heavy, self.author])
+            .order_by('-pub_date', '-id'))
+        follows.following_ids(self.reader.pk)
+
+        def get(**params):
+            request = RequestFactory().get('/follow/', params)
+            # Тяжёлые авторы, записи ленты и посты одного автора.
+            with self.assertNumQueries(3):
+                return timeline.get_page(request, self.reader, 4)
+
+        seen = []
+        for number in range(1, 6):
+            seen.extend(get(page=number))
+        page = get(page=5)
+        while page.has_next():
+            page = get(after=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, expected)
+        start = expected.index(page[0])
+        self.assertEqual(list(get(before=page.previous_cursor)),
+                         expected[start - 4:start])
+
+    def test_build_timelines_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('build_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), ['Старый пост'])
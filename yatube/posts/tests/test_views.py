@@ -187,21 +187,44 @@ class GroupPagesTests(TestCase):
                          response_group_2.context['page_obj'])
 
     def test_cache(self):
-        test_post = Post.objects.create(author=self.user_author)
-        response_before_post_delete = (self.authorized_client.
+        """Главная страница берётся из кэша, пока данные не изменились,
+        и обновляется сразу после изменения поста."""
+        test_post = Post.objects.create(author=self.user_author,
+                                        text='Пост для кэша')
+        response_before = self.authorized_client.get(reverse('posts:index'))
+        # update() не отправляет сигналов, поэтому кэш не сбрасывается.
+        Post.objects.filter(pk=test_post.pk).update(text='Изменённый')
+        response_cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_before.content, response_cached.content)
+        cache.clear()
+        response_after_cache_remove = (self.authorized_client.
                                        get(reverse('posts:index')))
-        content_before_post_delete = response_before_post_delete.content
+        self.assertContains(response_after_cache_remove, 'Изменённый')
         test_post.delete()
         response_after_post_delete = (self.authorized_client.
                                       get(reverse('posts:index')))
-        content_after_post_delete = response_after_post_delete.content
-        self.assertEqual(content_before_post_delete, content_after_post_delete)
-        cache.clear()
-        response_after_cache_remove = (self.authorized_client.
-                                       get(reverse('posts:index')))
-        content_after_cache_remove = response_after_cache_remove.content
-        self.assertNotEqual(content_before_post_delete,
-                            content_after_cache_remove)
+        self.assertNotContains(response_after_post_delete, 'Изменённый')
+
+    def test_cache_is_invalidated_by_changes(self):
+        """Новый пост и подписка сразу видны на закэшированных страницах."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user_author.username,)),
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        Post.objects.create(author=self.user_author, group=self.group,
+                            text='Свежий пост')
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(self.authorized_client.get(page),
+                                    'Свежий пост')
+        profile = reverse('posts:profile', args=(self.user_author.username,))
+        self.assertContains(self.authorized_client.get(profile), 'Отписаться')
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', args=(self.user_author.username,)))
+        self.assertContains(self.authorized_client.get(profile), 'Подписаться')
 
     def test_posts_feed(self):
         """Новая запись пользователя появляется в ленте тех,
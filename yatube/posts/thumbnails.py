@@ -0,0 +1,88 @@
+"""Предварительная генерация миниатюр картинок постов.
+
+Миниатюра для карточки и страницы поста создаётся sorl-thumbnail при
+первом показе, прямо в запросе. Чтобы первый зритель не ждал
+декодирования и обрезки большой картинки, после сохранения поста
+миниатюра создаётся в фоновом пуле потоков процесса.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Должны совпадать с параметрами тега {% thumbnail %} в шаблонах.
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def generate(name):
+    """Создаёт миниатюру картинки name из хранилища MEDIA_ROOT."""
+    started = time.perf_counter()
+    thumbnail = get_thumbnail(name, GEOMETRY, **OPTIONS)
+    metrics.THUMBNAIL_SECONDS.observe(time.perf_counter() - started)
+    return thumbnail
+
+
+def resolve(posts):
+    """Миниатюры картинок постов страницы: {id поста: миниатюра}.
+
+    Бэкенд из core.thumbnail_store находит записи о всех миниатюрах
+    одним get_many, а не отдельным запросом на каждый тег в карточке.
+    """
+    with_image = [post for post in posts if post.image]
+    if not with_image:
+        return {}
+    files = [post.image for post in with_image]
+    get_thumbnails = getattr(default.backend, 'get_thumbnails', None)
+    if get_thumbnails is not None:
+        found = get_thumbnails(files, GEOMETRY, **OPTIONS)
+    else:
+        found = [get_thumbnail(file_, GEOMETRY, **OPTIONS) for file_ in files]
+    return {post.pk: thumbnail for post, thumbnail in zip(with_image, found)}
+
+
+def _generate_in_background(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+    finally:
+        # Поток пула живёт дольше запроса: соединение с БД, открытое
+        # хранилищем sorl, закрываем сами.
+        connection.close()
+
+
+def submit(name):
+    if settings.THUMBNAIL_WORKERS:
+        get_executor().submit(_generate_in_background, name)
+    else:
+        generate(name)
+
+
+def schedule(post):
+    """Ставит миниатюру картинки поста в очередь после коммита."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: submit(name))
@@ -0,0 +1,272 @@
+"""Материализованная лента подписок (fan-out-on-write).
+
+При публикации пост раскладывается в ленты всех подписчиков автора, при
+подписке в ленту добавляются уже опубликованные посты автора, при
+отписке они удаляются. Для авторов, у которых подписчиков больше
+settings.TIMELINE_FANOUT_LIMIT, раскладка не делается: их посты
+подмешиваются в ленту при чтении (fan-out-on-read).
+"""
+import heapq
+
+from django.conf import settings
+from django.db import connection
+
+from . import follows
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import KeysetPaginator, key_range, paginate
+
+BATCH_SIZE = 500
+
+
+class TimelinePaginator(KeysetPaginator):
+    keys = ('pub_date', 'post_id')
+
+    def prepare(self, rows):
+        return [entry.post for entry in rows]
+
+
+class MergedTimelinePaginator(KeysetPaginator):
+    """Лента из записей TimelineEntry и постов тяжёлых авторов.
+
+    Каждый источник читается диапазоном по своему индексу: записи - по
+    (user, pub_date, post), посты автора - по (author, pub_date, id), не
+    больше строк, чем нужно странице. Слияние по (pub_date, id) идёт в
+    Python, поэтому SQLite не сортирует всю ленту во временном B-дереве.
+    Запросов на страницу - один плюс по одному на тяжёлого автора.
+    """
+
+    def __init__(self, sources, per_page, count=None, **kwargs):
+        # sources - пары (queryset, ключи (дата, id)); строки с полем
+        # post заменяются постом.
+        self.sources = [
+            (queryset.order_by(*(f'-{key}' for key in keys)), keys)
+            for queryset, keys in sources
+        ]
+        # Общего queryset для KeysetPaginator.__init__ у ленты нет.
+        super(KeysetPaginator, self).__init__([], per_page, **kwargs)
+        self.count_known = False
+
+    def _posts(self, rows):
+        return [getattr(row, 'post', row) for row in rows]
+
+    def _merge(self, lists, limit, reverse=True):
+        merged, last = [], None
+        rows = heapq.merge(
+            *lists, key=lambda post: (post.pub_date, post.pk),
+            reverse=reverse)
+        for post in rows:
+            # Запись ленты могла остаться от времени, когда автор ещё
+            # не был тяжёлым.
+            if post.pk != last:
+                merged.append(post)
+                last = post.pk
+            if len(merged) == limit:
+                break
+        return merged
+
+    def rows(self, bottom, limit):
+        lists = [self._posts(rows) for rows in self.heads(bottom + limit)]
+        return self._merge(lists, bottom + limit)[bottom:]
+
+    def heads(self, limit):
+        """Первые limit строк каждого источника."""
+        return [queryset[:limit] for queryset, _ in self.sources]
+
+    def ranges(self, cursor, lookup, limit):
+        """limit строк каждого источника за курсором, от ближайшей к нему."""
+        values = self.decode(cursor)
+        querysets = []
+        for queryset, keys in self.sources:
+            rows = key_range(queryset, keys, values, lookup)
+            if lookup == 'gt':
+                rows = rows.reverse()
+            querysets.append(rows[:limit])
+        return querysets
+
+    def _after(self, cursor, lookup, limit, reverse):
+        lists = [
+            self._posts(rows)
+            for rows in self.ranges(cursor, lookup, limit)
+        ]
+        return self._merge(lists, limit, reverse)
+
+    def rows_after(self, cursor, limit):
+        return self._after(cursor, 'lt', limit, reverse=True)
+
+    def rows_before(self, cursor, limit):
+        return self._after(cursor, 'gt', limit, reverse=False)
+
+
+def is_heavy(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def heavy_authors(user):
+    """Авторы из подписок user, посты которых не раскладываются в ленты."""
+    ids = sorted(follows.following_ids(user.pk))
+    heavy = []
+    # Подписок может быть больше, чем параметров в одном запросе SQLite.
+    for start in range(0, len(ids), BATCH_SIZE):
+        heavy.extend(heavy_among(ids[start:start + BATCH_SIZE]))
+    return heavy
+
+
+def heavy_among(author_ids):
+    """id тяжёлых авторов среди author_ids."""
+    return (
+        UserStats.objects
+        .filter(
+            user_id__in=author_ids,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        )
+        .values_list('user_id', flat=True)
+    )
+
+
+def entries(user_id):
+    """Записи ленты user_id вместе с постами."""
+    return (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .select_related('post__author', 'post__group')
+    )
+
+
+def author_entries(user_id, author_id):
+    return TimelineEntry.objects.filter(user_id=user_id, author_id=author_id)
+
+
+def sources(user_id, heavy):
+    """Источники MergedTimelinePaginator: лента и посты тяжёлых авторов."""
+    return [(entries(user_id), ('pub_date', 'post_id'))] + [
+        (
+            Post.objects.filter(author_id=author_id)
+            .select_related('author', 'group'),
+            ('pub_date', 'id'),
+        )
+        for author_id in heavy
+    ]
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_heavy(post.author_id):
+        return
+    followers = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту user_id уже опубликованные посты author_id."""
+    if is_heavy(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list('id', 'pub_date')
+    )
+    _insert(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def remove(user_id, author_id):
+    """Убирает посты author_id из ленты user_id после отписки.
+
+    Если с этой отпиской автор перестал быть тяжёлым, его посты
+    раскладываются в ленты оставшихся подписчиков: опубликованные, пока
+    подписчиков было больше лимита, иначе пропали бы из лент.
+    """
+    author_entries(user_id, author_id).delete()
+    crossed = UserStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+    if crossed:
+        fan_out_author(author_id)
+
+
+def _insert_from_follows(condition, params):
+    """Добавляет в ленты подписчиков посты, выбранные условием condition
+    над подписками f и постами p, одним INSERT ... SELECT."""
+    entries, follows, posts = (
+        model._meta.db_table for model in (TimelineEntry, Follow, Post)
+    )
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {entries} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follows} f '
+            f'INNER JOIN {posts} p ON p.author_id = f.author_id '
+            f'WHERE {condition} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params,
+        )
+
+
+def _not_heavy():
+    stats = UserStats._meta.db_table
+    return (
+        f'f.author_id NOT IN ('
+        f'SELECT user_id FROM {stats} WHERE followers_count > %s)',
+        [settings.TIMELINE_FANOUT_LIMIT],
+    )
+
+
+def fan_out_author(author_id):
+    """Добавляет все посты author_id в ленты всех его подписчиков."""
+    _insert_from_follows('f.author_id = %s', [author_id])
+
+
+def fan_out_since(post_id):
+    """Раскладывает по лентам посты с id больше post_id.
+
+    Для постов, вставленных bulk_create: сигналы о них не приходят.
+    """
+    not_heavy, params = _not_heavy()
+    _insert_from_follows(f'p.id > %s AND {not_heavy}', [post_id] + params)
+
+
+def rebuild():
+    """Пересобирает все ленты по текущим подпискам.
+
+    Записи вставляются одним INSERT ... SELECT: после массовой загрузки
+    backfill по каждой подписке занимал бы минуты.
+    """
+    TimelineEntry.objects.all().delete()
+    _insert_from_follows(*_not_heavy())
+
+
+def get_page(request, user, per_page):
+    """Страница ленты подписок user."""
+    heavy = heavy_authors(user)
+    if not heavy:
+        return paginate(request, entries(user.pk), per_page,
+                        TimelinePaginator)
+    return paginate(request, sources(user.pk, heavy), per_page,
+                    MergedTimelinePaginator)
@@ -1,21 +1,49 @@
+from urllib.parse import urlencode
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
 
+from core import db
+from core.decorators import query_budget
+
+from . import counters, export, follows, fulltext, thumbnails, timeline
+from .caching import (
+    cache_page_by_generation, generation_etag, group_scopes, index_scopes,
+    post_detail_scopes, profile_scopes, search_scopes,
+)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Group, Post, User
+from .paginator import paginate
 
 numb_of_obj = 10
 
 
-@cache_page(20)
+# Запросы лент. По ним же строит планы query_plans (explain_feeds).
+def index_list():
+    return Post.objects.select_related('author', 'group')
+
+
+def group_list(group):
+    return group.all_posts.select_related('author')
+
+
+def profile_list(author):
+    return author.posts.select_related('group')
+
+
+def comment_list(post):
+    return post.comments.select_related('author')
+
+
+@query_budget(6)
+@generation_etag(index_scopes)
+@cache_page_by_generation(index_scopes)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, numb_of_obj)
+    post_list = index_list()
+    page_obj = paginate(request, post_list, numb_of_obj)
     title = 'Yatube'
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     context = {
         'page_obj': page_obj,
         'title': title,
@@ -23,12 +51,13 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(6)
+@generation_etag(group_scopes)
+@cache_page_by_generation(group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.all_posts.all()
-    paginator = Paginator(post_list, numb_of_obj)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = Group.cached.get_or_404(slug=slug)
+    post_list = group_list(group)
+    page_obj = paginate(request, post_list, numb_of_obj)
     title = group.title
     context = {
         'group': group,
@@ -39,20 +68,22 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(6)
+@generation_etag(profile_scopes)
+@cache_page_by_generation(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_posts = author.posts.all()
-    posts_count = author_posts.count()
-    paginator = Paginator(author_posts, numb_of_obj)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = User.cached.get_or_404(username=username)
+    author_posts = profile_list(author)
+    stats = counters.get(author)
+    page_obj = paginate(request, author_posts, numb_of_obj,
+                        count=stats.posts_count)
     title = f'Профайл пользователя {author}'
-    following = Follow.objects.filter(author_id=author.id,
-                                      user_id=request.user.id).exists()
+    following = follows.is_following(request.user, author.pk)
     context = {
         'author': author,
         'posts': author_posts,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
         'title': title,
         'following': following,
@@ -60,12 +91,14 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(6)
+@generation_etag(post_detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = post.author.posts.count()
+    post = Post.cached.get_or_404(pk=post_id)
+    posts_count = counters.get(post.author).posts_count
     title = post.text[:30]
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comment_list(post)
     context = {
         'post': post,
         'posts_count': posts_count,
@@ -76,6 +109,24 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(6)
+@generation_etag(search_scopes)
+@cache_page_by_generation(search_scopes)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if fulltext.terms(query):
+        page_obj = fulltext.get_page(request, query, numb_of_obj)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'page_query': urlencode({'q': query}) + '&',
+        'title': f'Поиск: {query}' if query else 'Поиск',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(10)
 @login_required
 def post_create(request):
     form = PostForm(
@@ -88,16 +139,21 @@ def post_create(request):
         'title': title,
     }
     if form.is_valid():
-        form = form.save(commit=False)
-        form.author = request.user
-        form.save()
+        post = form.save(commit=False)
+        post.author = request.user
+        # Повторяется только запись: файл картинки сохраняется в
+        # хранилище один раз, при первой попытке.
+        db.atomic_with_retry(post.save)
+        thumbnails.schedule(post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(10)
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
@@ -113,57 +169,71 @@ def post_edit(request, post_id):
         'title': title,
     }
     if form.is_valid():
-        form.save()
+        post = db.atomic_with_retry(form.save)
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, 'posts/create_post.html', context)
 
 
+@query_budget(6)
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = Post.cached.get_or_404(pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        db.atomic_with_retry(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@staff_member_required
+def export_content(request, kind):
+    """Потоковая выгрузка для персонала, параметры - как у команды."""
+    file_format = request.GET.get('format', 'jsonl')
+    try:
+        lines = export.stream(
+            kind,
+            file_format,
+            author=request.GET.get('author'),
+            group=request.GET.get('group'),
+            since=request.GET.get('since'),
+            until=request.GET.get('until'),
+        )
+    except export.ExportError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        lines, content_type=export.FORMATS[file_format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{file_format}"')
+    return response
+
+
+@query_budget(6)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, numb_of_obj)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.get_page(request, request.user, numb_of_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(12)
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=request.user, author=author).exists():
-        return redirect('posts:profile', username=request.user.username)
-    else:
-        if author != request.user:
-            following = Follow.objects.create(
-                user=request.user,
-                author=author,
-            )
-            following.save()
+    author = User.cached.get_or_404(username=username)
+    if author != request.user:
+        follows.follow(request.user, author)
     return redirect('posts:profile', username=request.user.username)
 
 
+@query_budget(10)
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = User.cached.get_or_404(username=username)
     if author != request.user:
-        following = Follow.objects.get(
-            user=request.user,
-            author=author,
-        )
-        following.delete()
+        follows.unfollow(request.user, author)
     return redirect('posts:profile', username=request.user.username)
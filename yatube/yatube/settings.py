@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -64,7 +70,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,9 +95,53 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос, а не открывается заново.
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Реплики только для чтения (core.routers). Локальную реплику-файл
+# можно включить переменной окружения и обновлять командой
+# sync_replica; без неё всё читается из default.
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['YATUBE_REPLICA_DB'],
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_READ_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+)
+# После изменения данных браузер столько секунд читает из default.
+REPLICA_STICKY_COOKIE = 'read_primary'
+REPLICA_STICKY_SECONDS = 30
+# Насколько реплика может отставать; столько же живут в кэше страницы,
+# собранные по её данным.
+REPLICA_MAX_LAG = 10
+
+# Прагмы каждого соединения с SQLite (core.db.configure_connection).
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - в КиБ, то есть 64 МиБ.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Повторы транзакций записи при "database is locked"
+# (core.db.atomic_with_retry).
+DB_LOCKED_RETRIES = 5
+DB_LOCKED_BACKOFF = 0.02
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,6 +183,27 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# Сессии читаются из кэша и пишутся и в него, и в БД. Кэш - общий
+# SQLite без L1: данные сессии перезаписываются по тому же ключу, и
+# другой процесс не должен видеть прежние.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'shared'
+
+# Пользователь запроса берётся из кэша (core.auth). ModelBackend остаётся
+# для сессий, созданных до CachedModelBackend: иначе их владельцы
+# окажутся разлогинены.
+AUTHENTICATION_BACKENDS = [
+    'core.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Объекты Model.cached (core.objectcache) и отметки об их отсутствии.
+OBJECT_CACHE_TIMEOUT = 60 * 10
+OBJECT_CACHE_MISS_TIMEOUT = 60
+# Множества подписок пользователей (posts.follows); сбрасываются при
+# подписке и отписке, таймаут нужен только для вытеснения.
+FOLLOW_SET_TIMEOUT = 60 * 60 * 24
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -146,8 +217,116 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки больше 1 МБ пишутся во временный файл, а больше
+# MAX_UPLOAD_SIZE - отбрасываются по мере приёма (core.uploadhandler).
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+FILE_UPLOAD_HANDLERS = [
+    'core.uploadhandler.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Картинки постов (posts.images): больше POST_IMAGE_MAX_PIXELS
+# отклоняются, больше POST_IMAGE_MAX_SIDE или POST_IMAGE_RECOMPRESS_SIZE
+# уменьшаются и пережимаются в POST_IMAGE_WORKERS процессах
+# (0 - в процессе запроса).
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_RECOMPRESS_SIZE = 512 * 1024
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_WORKERS = 2
+
+# Тесты (manage.py test и pytest) и замеры run_benchmark создают свои
+# данные и не должны трогать кэш запущенного сервера.
+_isolated_run = (
+    sys.argv[1:2] in (['test'], ['run_benchmark'])
+    or 'pytest' in sys.modules
+)
+
+# Каталог общего кэша. В кэше лежат сессии и пользователи, поэтому
+# каталог создаётся с правами 0700, а файл - 0600 (core.cache.sqlite).
+# Изолированные запуски получают свой временный каталог.
+CACHE_DIR = os.environ.get(
+    'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+if _isolated_run:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, True)
+
+# Кэш в файле SQLite, общий для всех процессов на машине
+# (core.cache.sqlite): смена поколения страниц видна всем воркерам.
+# Перед ним - LRU в памяти процесса (core.cache.tiered): горячие ключи
+# читаются без обращения к файлу, delete и incr сбрасывают в нём ключи
+# того же пространства (префикса до двоеточия) во всех процессах не
+# позже чем через EPOCH_CHECK_INTERVAL секунд.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.tiered.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 2000,
+            'L1_TIMEOUT': 5,
+            'EPOCH_CHECK_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
+    },
 }
+
+# Авторы, у которых подписчиков больше этого числа, не раскладываются
+# по лентам подписчиков при публикации: их посты добавляются в ленту
+# при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Страницы лент кэшируются до смены поколения (см. posts.caching),
+# таймаут только ограничивает время жизни устаревших записей.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 4
+# Новую версию страницы собирает один запрос; блокировка снимается сама
+# через PAGE_REBUILD_LOCK_TIMEOUT, если он упал. Без прежней версии
+# остальные ждут готовую не дольше PAGE_REBUILD_WAIT секунд.
+PAGE_REBUILD_LOCK_TIMEOUT = 30
+PAGE_REBUILD_WAIT = 2
+# Коэффициент раннего истечения (XFetch), 0 - выключено.
+PAGE_CACHE_EARLY_BETA = 1.0
+
+# Ключ карточки поста зависит от её содержимого, поэтому карточки
+# не устаревают и таймаут нужен только для вытеснения.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Превышение бюджета запросов (core.decorators.query_budget) пишется
+# в лог; с True представление завершается ошибкой QueryBudgetExceeded.
+QUERY_BUDGET_STRICT = False
+
+# Заголовок Server-Timing с замерами запроса (core.middleware) и число
+# самых медленных запросов, которые хранятся для страницы core:slow_requests.
+SERVER_TIMING_HEADER = True
+SLOW_REQUESTS_SIZE = 50
+
+# Метрики /metrics (core.metrics): каждый процесс пишет свои значения в
+# файл в METRICS_DIR не чаще раза в METRICS_FLUSH_INTERVAL секунд.
+# Каталог общий для всех воркеров и очищается при развёртывании. Он
+# создаётся с правами 0700: /metrics складывает все файлы каталога.
+# Изолированные запуски, как и для кэша, получают временный каталог.
+METRICS_DIR = os.environ.get(
+    'YATUBE_METRICS_DIR', os.path.join(BASE_DIR, '.metrics'))
+if _isolated_run:
+    METRICS_DIR = tempfile.mkdtemp(prefix='yatube-test-metrics-')
+    atexit.register(shutil.rmtree, METRICS_DIR, True)
+METRICS_FLUSH_INTERVAL = 5
+
+# Потоки для фоновой генерации миниатюр новых картинок (posts.thumbnails);
+# 0 - генерировать сразу в запросе.
+THUMBNAIL_WORKERS = 2
+
+# Миниатюры карточек страницы ищутся пакетно, записи sorl кэшируются
+# в памяти процесса.
+THUMBNAIL_BACKEND = 'core.thumbnail_store.ThumbnailBackend'
+THUMBNAIL_KVSTORE = 'core.thumbnail_store.KVStore'
+THUMBNAIL_KVSTORE_LRU_SIZE = 1000
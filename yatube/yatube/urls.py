@@ -18,12 +18,16 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from core import views as core_views
+
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('', include('posts.urls', namespace='posts')),
     path('admin/', admin.site.urls),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('perf/', include('core.urls', namespace='core')),
+    path('metrics', core_views.metrics, name='metrics'),
 ]
 
 handler404 = 'core.views.page_not_found'